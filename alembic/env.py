@@ -10,6 +10,9 @@ from api.config.database import url
 from api.models.creditors import Creditor
 from api.models.users import User, IncomeSource
 from api.models.invoices import Invoice
+from api.models.tasks import Task
+from api.models.changes import Change
+from api.models.idempotency import IdempotencyKey
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,59 @@
+"""Create change table
+
+Revision ID: 2b9e4f7c1d58
+Revises: e7a3c5d90b14
+Create Date: 2026-10-19 17:10:32.449106
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2b9e4f7c1d58"
+down_revision: Union[str, None] = "e7a3c5d90b14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("entity", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("deleted", sa.Boolean(), nullable=False),
+        sa.Column(
+            "changed_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "entity", "entity_id"),
+    )
+    op.create_index(
+        "ix_change_user_id_version",
+        "change",
+        ["user_id", "version", "entity", "entity_id"],
+    )
+    # Existing rows, so a first sync without a cursor returns everything.
+    op.execute(
+        """
+        INSERT INTO change (user_id, entity, entity_id, version, deleted)
+        SELECT invoice.user_id, 'invoice', invoice.id, "user".data_version,
+               NOT invoice.enabled
+        FROM invoice JOIN "user" ON "user".id = invoice.user_id
+        UNION ALL
+        SELECT creditor.user_id, 'creditor', creditor.id, "user".data_version,
+               NOT creditor.enabled
+        FROM creditor JOIN "user" ON "user".id = creditor.user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_user_id_version", table_name="change")
+    op.drop_table("change")
@@ -0,0 +1,28 @@
+"""Create task failed at column
+
+Revision ID: 4c8e2a7f9d13
+Revises: 6f1a8c3e5b27
+Create Date: 2026-10-19 21:12:08.524617
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c8e2a7f9d13"
+down_revision: Union[str, None] = "6f1a8c3e5b27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("task", sa.Column("failed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("task", "failed_at")
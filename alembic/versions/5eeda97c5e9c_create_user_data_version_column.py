@@ -0,0 +1,31 @@
+"""Create user data version column
+
+Revision ID: 5eeda97c5e9c
+Revises: 3fd2c4d3582e
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5eeda97c5e9c"
+down_revision: Union[str, None] = "3fd2c4d3582e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("data_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("user", "data_version")
@@ -0,0 +1,45 @@
+"""Create idempotency key table
+
+Revision ID: 6f1a8c3e5b27
+Revises: 2b9e4f7c1d58
+Create Date: 2026-10-19 18:34:51.093318
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6f1a8c3e5b27"
+down_revision: Union[str, None] = "2b9e4f7c1d58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "idempotency_key",
+        sa.Column("scope", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("key", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("fingerprint", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("response", postgresql.JSONB(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True
+        ),
+        sa.PrimaryKeyConstraint("scope", "key"),
+    )
+    op.create_index(
+        op.f("ix_idempotency_key_expires_at"), "idempotency_key", ["expires_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_idempotency_key_expires_at"), table_name="idempotency_key")
+    op.drop_table("idempotency_key")
@@ -0,0 +1,34 @@
+"""Create creditor user enabled index
+
+Revision ID: 8d2f6b1e4a73
+Revises: c41e7a9b2d10
+Create Date: 2026-10-19 15:21:08.204613
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f6b1e4a73"
+down_revision: Union[str, None] = "c41e7a9b2d10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves the creditor listing's filter and its ORDER BY id in index order.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_creditor_user_id_enabled "
+            "ON creditor (user_id, id) WHERE enabled"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_creditor_user_id_enabled")
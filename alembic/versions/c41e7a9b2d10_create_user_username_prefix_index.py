@@ -0,0 +1,35 @@
+"""Create user username prefix index
+
+Revision ID: c41e7a9b2d10
+Revises: 5eeda97c5e9c
+Create Date: 2026-10-19 14:03:27.512907
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c41e7a9b2d10"
+down_revision: Union[str, None] = "5eeda97c5e9c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Byte-wise collation lets LIKE 'prefix%' use the index as a range scan,
+    # already in the order user search pages through.
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_username_prefix '
+            'ON "user" (lower(username) COLLATE "C", id)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_username_prefix")
@@ -0,0 +1,27 @@
+from typing import NamedTuple
+
+
+class Budget(NamedTuple):
+    queries: int
+    p95_ms: float
+
+
+# Maximum SQL statements per request and p95 latency per endpoint. Query budgets
+# must not depend on the amount of data: a lazy relationship added to a listing
+# shows up as a budget breach before it shows up as latency.
+BUDGETS: dict[tuple[str, str], Budget] = {
+    ("GET", "/invoices"): Budget(queries=8, p95_ms=150),
+    ("GET", "/creditors"): Budget(queries=3, p95_ms=100),
+    ("GET", "/creditors/list"): Budget(queries=3, p95_ms=100),
+    ("GET", "/users"): Budget(queries=2, p95_ms=50),
+    ("GET", "/users/search"): Budget(queries=2, p95_ms=50),
+    ("GET", "/sync"): Budget(queries=5, p95_ms=100),
+    ("GET", "/analytics/invoices_by_creditor"): Budget(queries=2, p95_ms=250),
+    ("GET", "/analytics/invoices_by_month"): Budget(queries=2, p95_ms=250),
+    ("GET", "/analytics/invoices_by_week"): Budget(queries=2, p95_ms=100),
+    ("GET", "/analytics/invoices_by_payment_type"): Budget(queries=2, p95_ms=250),
+    ("PATCH", "/invoices/mark_as_paid"): Budget(queries=5, p95_ms=150),
+    # Answers with every overdue invoice of every user, so its latency follows
+    # the table: ~35k rows at the largest size in tests/.
+    ("PATCH", "/invoices/mark_all_as_paid"): Budget(queries=4, p95_ms=2000),
+}
@@ -1,10 +1,245 @@
+import hmac
+import threading
+from contextvars import ContextVar
+from hashlib import sha256
+from time import perf_counter, time
+
+import anyio
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from sqlmodel import create_engine, Session
+
 from api.config.settings import get_env
+from api.utils.metrics import (
+    db_pool_checked_out,
+    db_pool_overflow,
+    db_pool_size,
+    db_pool_wait,
+)
+from api.utils.sql import instrument_engine
+
+env = get_env()
+url = env.DATABASE_URL
+
+READ_YOUR_WRITES = "X-Read-Your-Writes"
+
+# Read-only routes served by the analytics engine, which points at the replica
+# when DATABASE_REPLICA_URL is set. /creditors/list is left on the primary: it
+# is served from the creditor directory, which must never cache replica lag.
+READ_ONLY_ROUTES = {
+    ("GET", "/invoices"),
+    ("GET", "/creditors"),
+    ("GET", "/analytics/invoices_by_creditor"),
+    ("GET", "/analytics/invoices_by_month"),
+    ("GET", "/analytics/invoices_by_week"),
+    ("GET", "/analytics/invoices_by_payment_type"),
+}
+
+# Per route class, as set by the admission middleware; other classes keep the
+# default of the engine they run on.
+STATEMENT_TIMEOUTS = {
+    "auth": env.AUTH_STATEMENT_TIMEOUT_MS,
+    "analytics": env.ANALYTICS_STATEMENT_TIMEOUT_MS,
+}
+default_timeouts: dict[str, int] = {}
+
+
+class InFlightQuery:
+    """DBAPI connection running a statement for the current request, if any."""
+
+    __slots__ = ("lock", "connection", "cancelled")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connection = None
+        self.cancelled = False
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.connection is not None:
+                self.connection.cancel()
+
+
+in_flight_query: ContextVar[InFlightQuery | None] = ContextVar(
+    "in_flight_query", default=None
+)
+
+
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    query = in_flight_query.get()
+    if query is not None:
+        with query.lock:
+            query.connection = conn.connection.dbapi_connection
+
+
+def query_finished(conn, *args):
+    query = in_flight_query.get()
+    if query is not None:
+        with query.lock:
+            query.connection = None
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(perf_counter() - start, self.logging_name)
+
+
+def build_engine(
+    name: str, url: str, pool_size: int, max_overflow: int, statement_timeout: int
+):
+    engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_recycle=3600,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_logging_name=name,
+        connect_args={"options": f"-c statement_timeout={statement_timeout}"},
+    )
+    default_timeouts[name] = statement_timeout
+    instrument_engine(engine)
+    event.listen(engine, "before_cursor_execute", query_started)
+    event.listen(engine, "after_cursor_execute", query_finished)
+    event.listen(engine, "handle_error", query_finished)
+
+    db_pool_checked_out.set_function(lambda: engine.pool.checkedout(), name)
+    db_pool_overflow.set_function(lambda: max(engine.pool.overflow(), 0), name)
+    db_pool_size.set_function(lambda: engine.pool.size(), name)
+    return engine
+
+
+# Logins and writes keep their own pool, so a dashboard burst cannot starve them.
+engine = build_engine(
+    "oltp", url, env.DB_POOL_SIZE, env.DB_MAX_OVERFLOW, env.STATEMENT_TIMEOUT_MS
+)
+analytics_engine = build_engine(
+    "analytics",
+    env.DATABASE_REPLICA_URL or url,
+    env.ANALYTICS_POOL_SIZE,
+    env.ANALYTICS_MAX_OVERFLOW,
+    env.ANALYTICS_STATEMENT_TIMEOUT_MS,
+)
+
+
+def sign(value: str):
+    return hmac.new(env.TOKEN_SECRET.encode(), value.encode(), sha256).hexdigest()
+
+
+def read_your_writes_token():
+    """Pins the client to the primary until the replica has caught up."""
+    expires = str(int((time() + env.READ_YOUR_WRITES_SECONDS) * 1000))
+    return f"{expires}.{sign(expires)}"
+
+
+def pinned_to_primary(token: str | None):
+    if not token:
+        return False
+    expires, _, signature = token.partition(".")
+    return (
+        expires.isdigit()
+        and hmac.compare_digest(signature, sign(expires))
+        and int(expires) > time() * 1000
+    )
+
+
+def uses_analytics_engine(method: str, path: str, token: str | None):
+    """Whether a request is served by the analytics engine; admission control
+    classifies requests with it too, so they queue for the pool they use."""
+    return (method, path) in READ_ONLY_ROUTES and not pinned_to_primary(token)
+
+
+def session_engine(request: Request):
+    route = request.scope.get("route")
+    if route is not None and uses_analytics_engine(
+        request.method, route.path, request.headers.get(READ_YOUR_WRITES)
+    ):
+        return analytics_engine
+    return engine
+
+
+class RequestSession(Session):
+    """Session that can hand its connection back before the response is sent."""
+
+    def release(self):
+        # Only a clean transaction is ended early: uncommitted changes are left
+        # for close() to roll back, exactly as before.
+        if not self.in_transaction() or self.info.get("flushed"):
+            return
+        if self.new or self.dirty or self.deleted:
+            return
+        # Ends a read-only transaction without expiring the loaded objects
+        # (expire_on_commit=False), so serialization can still read them.
+        self.commit()
+
+
+@event.listens_for(RequestSession, "after_begin")
+def set_statement_timeout(session, transaction, connection):
+    timeout = session.info.get("statement_timeout")
+    if timeout is not None:
+        # Straight on the DBAPI cursor, so it is not counted as a request query.
+        with connection.connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+@event.listens_for(RequestSession, "after_flush")
+def mark_flushed(session, flush_context):
+    session.info["flushed"] = True
+
+
+@event.listens_for(RequestSession, "after_transaction_end")
+def clear_flushed(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("flushed", None)
+
+
+# Sessions opened by the request being served, released once its endpoint returns.
+request_sessions: ContextVar[list[RequestSession] | None] = ContextVar(
+    "request_sessions", default=None
+)
+
+
+def release_sessions():
+    for session in request_sessions.get() or ():
+        session.release()
+
+
+# Handing a connection back gets its own threads: queued behind sync
+# dependencies that wait for a connection, it would wait on itself until the
+# pool timeout whenever those fill the default limiter.
+release_limiter = anyio.CapacityLimiter(
+    env.DB_POOL_SIZE
+    + env.DB_MAX_OVERFLOW
+    + env.ANALYTICS_POOL_SIZE
+    + env.ANALYTICS_MAX_OVERFLOW
+)
+
 
-url = get_env().DATABASE_URL
+async def run_releasing(function):
+    await anyio.to_thread.run_sync(function, limiter=release_limiter)
 
 
-def get_db():
-    engine = create_engine(url, pool_recycle=3600, pool_size=10, max_overflow=5)
-    with Session(engine, expire_on_commit=False) as session:
+async def get_db(request: Request):
+    # Creating a Session does no I/O: the connection is checked out on first use.
+    bind = session_engine(request)
+    timeout = STATEMENT_TIMEOUTS.get(request.scope.get("route_class"))
+    if timeout == default_timeouts[bind.pool.logging_name]:
+        timeout = None
+    session = RequestSession(
+        bind, expire_on_commit=False, info={"statement_timeout": timeout}
+    )
+    sessions = request_sessions.get()
+    if sessions is not None:
+        sessions.append(session)
+    try:
         yield session
+    finally:
+        if session.in_transaction():
+            await run_releasing(session.close)
+        else:
+            session.close()
@@ -1,7 +1,25 @@
+from threading import Lock
+
 from pwdlib import PasswordHash
 
+from api.utils.metrics import password_hashes_in_progress
+
 pwd_context = PasswordHash.recommended()
 
+# Argon2 is deliberately slow and memory hungry, so it only ever runs on the
+# request's threadpool thread, never on the event loop.
+_running = 0
+_running_lock = Lock()
+
+
+def _track_running(amount: int):
+    global _running
+    with _running_lock:
+        _running += amount
+
+
+password_hashes_in_progress.set_function(lambda: _running)
+
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
@@ -9,3 +27,12 @@ def get_password_hash(password: str):
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def run_hashing(func, *args):
+    """Runs a hashing function on the calling thread, counted while it runs."""
+    _track_running(1)
+    try:
+        return func(*args)
+    finally:
+        _track_running(-1)
@@ -1,14 +1,72 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DATABASE_REPLICA_URL: str | None = None
     TOKEN_ACCESS_EXPIRE_MINUTES: str
     TOKEN_SECRET: str
     TOKEN_ALGORITHM: str
     API_KEY: str
+    WARMUP_CONNECTIONS: int = 4
+    WARMUP_RETRY_SECONDS: float = 5
+
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
+    ANALYTICS_POOL_SIZE: int = 5
+    ANALYTICS_MAX_OVERFLOW: int = 5
+    READ_YOUR_WRITES_SECONDS: float = 5
+    STATEMENT_TIMEOUT_MS: int = 10_000
+    AUTH_STATEMENT_TIMEOUT_MS: int = 2_000
+    ANALYTICS_STATEMENT_TIMEOUT_MS: int = 5_000
+
+    # JSON list, e.g. ["https://app.example.com"].
+    CORS_ORIGINS: list[str] = ["*"]
+
+    THREADPOOL_SIZE: int | None = None
+    ADMISSION_QUEUE: int = 64
+    ADMISSION_TIMEOUT_SECONDS: float = 2
+    ADMISSION_RETRY_AFTER: int = 1
+
+    CACHE_REDIS_URL: str | None = None
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.05
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 30
+    CREDITOR_DIRECTORY_USERS: int = 10_000
+    CREDITOR_DIRECTORY_TTL_SECONDS: float = 30
+    ANALYTICS_CACHE_SIZE: int = 10_000
+    ANALYTICS_CACHE_TTL_SECONDS: float = 300
+
+    BATCH_MAX_OPERATIONS: int = 100
+
+    IDEMPOTENCY_TTL_SECONDS: int = 86_400
+    IDEMPOTENCY_PRUNE_INTERVAL_SECONDS: float = 3600
+
+    TASK_WORKERS: int = 2
+    TASK_POLL_SECONDS: float = 1
+    TASK_RETRY_MAX_SECONDS: float = 300
+    TASK_MAX_ATTEMPTS: int = 10
+    TASK_METRICS_INTERVAL_SECONDS: float = 15
+
+    SYNC_RETENTION_DAYS: int = 30
+    SYNC_PRUNE_INTERVAL_SECONDS: float = 3600
+
+    EVENTS_QUEUE_SIZE: int = 16
+    EVENTS_HEARTBEAT_SECONDS: float = 15
+    EVENTS_RECONNECT_SECONDS: float = 3
+
+    SQL_MAX_QUERIES: int = 20
+    SQL_MAX_DB_TIME_MS: float = 250
+    SQL_SLOW_QUERY_MS: float = 100
+    SQL_REPEATED_STATEMENTS: int = 5
+    SQL_STRICT: bool = False
+
+    PROFILE_DIR: str = os.path.join(tempfile.gettempdir(), "invoicehub-profiles")
+    PROFILE_KEEP: int = 50
+    PROFILE_INTERVAL_MS: float = 1
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(__file__), "..", ".env")
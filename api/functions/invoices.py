@@ -1,16 +1,29 @@
+from datetime import datetime, time
 from http import HTTPStatus
 from typing import Annotated
 
 from fastapi import Depends, HTTPException
-from sqlalchemy import INTEGER, text, literal
-from sqlmodel import Session, select, func, case
+from sqlalchemy import INTEGER, text, literal, update
+from sqlmodel import Session, and_, or_, select, func, case
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 
 from api.config.database import get_db
 from api.models.creditors import Creditor
-from api.models.invoices import ExternalPaymentCreditorUpdate, Invoice, InvoiceBase
+from api.models.invoices import (
+    ExternalPaymentCreditorUpdate,
+    Invoice,
+    InvoiceBase,
+    InvoiceUpdateBase,
+)
 from api.models.users import User
 from api.utils.auth import get_current_user
+from api.utils.changes import record_changes
+from api.utils.directory import (
+    get_creditor_directory,
+    invalidate_creditors,
+    lookup_creditor,
+)
+from api.utils.tasks import enqueue, task_handler
 
 
 def create_external_payment(
@@ -33,48 +46,85 @@ def create_external_payment(
         creditor_parent_id=new_invoice.creditor_id,
     )
     db.add(external_payment_invoice)
-    db.commit()
-    db.refresh(external_payment_invoice)
 
     if creditor.creditor_type == "USER":
+        # Mirrored into the other user's account by a task once this commits.
+        responsible_creditor = None
+        if new_invoice.creditor_id is not None:
+            responsible_creditor = lookup_creditor(
+                db, get_creditor_directory(db, user.id), new_invoice.creditor_id
+            )
+        enqueue(
+            db,
+            "mirror_invoice",
+            {
+                "user_id": user.id,
+                "username": user.username,
+                "partner_id": creditor.user_as_creditor_id,
+                "due_date": (
+                    responsible_creditor.due_date.isoformat()
+                    if responsible_creditor is not None
+                    else None
+                ),
+                "purchase_date": new_invoice.purchase_date.isoformat(),
+                "title": new_invoice.title,
+                "value": payment.value,
+                "installments": new_invoice.installments,
+                "payment_type": new_invoice.payment_type,
+                "paid_status": new_invoice.paid_status,
+            },
+        )
+
+    db.flush()
+
+
+@task_handler("mirror_invoice")
+def mirror_invoice(db: Session, payload: dict):
+    user_id = payload["user_id"]
+    partner_id = payload["partner_id"]
+    # Locks the partner's row first, so concurrent mirrors between the same two
+    # users cannot both create the creditor below. The flush bumps its version.
+    db.exec(select(User.id).where(User.id == partner_id).with_for_update())
+
+    directory = get_creditor_directory(db, partner_id)
+    new_creditor = directory.by_user_as_creditor.get(user_id)
+    if new_creditor is None:
         query = select(Creditor).where(
-            (Creditor.user_id == creditor.user_as_creditor_id)
-            & (Creditor.user_as_creditor_id == user.id)
+            (Creditor.user_id == partner_id) & (Creditor.user_as_creditor_id == user_id)
         )
         new_creditor = db.scalar(query)
 
-        if new_creditor is None:
-            new_creditor = Creditor(
-                user_id=creditor.user_as_creditor_id,
-                creditor_type="USER",
-                name=user.username,
-                user_as_creditor_id=user.id,
-                due_date=new_invoice.responsible_creditor.due_date,
-            )
-            db.add(new_creditor)
-            db.commit()
-            db.refresh(new_creditor)
-
-        elif not new_creditor.enabled:
-            new_creditor = new_creditor.sqlmodel_update({"enabled": True})
-            db.add(new_creditor)
-            db.commit()
-            db.refresh(new_creditor)
-
-        user_creditor_invoice = Invoice(
-            user_id=creditor.user_as_creditor_id,
-            creditor_id=new_creditor.id,
-            purchase_date=new_invoice.purchase_date,
-            title=new_invoice.title,
-            value=payment.value,
-            installments=new_invoice.installments,
-            payment_type=new_invoice.payment_type,
-            paid_status=new_invoice.paid_status,
-            creditor_parent_id=new_creditor.id,
+    if new_creditor is None:
+        new_creditor = Creditor(
+            user_id=partner_id,
+            creditor_type="USER",
+            name=payload["username"],
+            user_as_creditor_id=user_id,
         )
-        db.add(user_creditor_invoice)
-        db.commit()
-        db.refresh(user_creditor_invoice)
+        if payload["due_date"] is not None:
+            new_creditor.due_date = datetime.fromisoformat(payload["due_date"])
+        db.add(new_creditor)
+        invalidate_creditors(db, partner_id)
+        db.flush()
+
+    elif not new_creditor.enabled:
+        new_creditor = db.get(Creditor, new_creditor.id)
+        new_creditor.sqlmodel_update({"enabled": True})
+        db.add(new_creditor)
+        invalidate_creditors(db, partner_id)
+
+    user_creditor_invoice = Invoice(
+        user_id=partner_id,
+        creditor_id=new_creditor.id,
+        purchase_date=datetime.fromisoformat(payload["purchase_date"]),
+        title=payload["title"],
+        value=payload["value"],
+        installments=payload["installments"],
+        payment_type=payload["payment_type"],
+        paid_status=payload["paid_status"],
+        creditor_parent_id=new_creditor.id,
+    )
+    db.add(user_creditor_invoice)
 
 
 def validate_invoice(
@@ -82,9 +132,10 @@ def validate_invoice(
     db: Annotated[Session, Depends(get_db)],
     invoice: InvoiceBase,
 ):
+    directory = get_creditor_directory(db, user.id)
+
     if invoice.creditor_id is not None:
-        query = select(Creditor).where(Creditor.id == invoice.creditor_id)
-        creditor = db.scalar(query)
+        creditor = lookup_creditor(db, directory, invoice.creditor_id)
         if creditor is not None:
             if not creditor.enabled:
                 raise HTTPException(
@@ -129,8 +180,7 @@ def validate_invoice(
     if external_payments:
         creditors = []
         for item in external_payments:
-            query = select(Creditor).where((Creditor.id == item.creditor_id))
-            creditor = db.scalar(query)
+            creditor = lookup_creditor(db, directory, item.creditor_id)
 
             if creditor == None:
                 raise HTTPException(
@@ -172,6 +222,140 @@ def validate_invoice(
     return creditors, external_payments
 
 
+def check_invoice_access(user: User, invoice: Invoice | None, action: str):
+    if invoice is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item not found")
+    if invoice.user_id != user.id:
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN,
+            detail=f"You do not have permission to {action} this item.",
+        )
+
+
+def add_invoice(
+    user: User,
+    db: Session,
+    invoice: InvoiceBase,
+    creditors: list,
+    external_payments: list,
+):
+    """Adds a purchase and its external payments, flushed but not committed."""
+    new_invoice = Invoice(
+        user_id=user.id,
+        creditor_id=invoice.creditor_id,
+        purchase_date=datetime.combine(invoice.purchase_date, time.min),
+        title=invoice.title,
+        value=invoice.value,
+        installments=invoice.installments,
+        payment_type=invoice.payment_type,
+        paid_status=invoice.paid_status,
+        creditor_parent_id=invoice.creditor_id,
+    )
+
+    db.add(new_invoice)
+    db.flush()
+
+    for creditor, payment in zip(creditors, external_payments):
+        create_external_payment(user, db, creditor, payment, new_invoice)
+
+    new_invoice.sqlmodel_update({"external_payments": external_payments})
+    return new_invoice
+
+
+def edit_invoice(
+    user: User,
+    db: Session,
+    db_invoice: Invoice,
+    invoice: InvoiceUpdateBase,
+    creditors: list,
+    external_payments: list,
+):
+    """Applies an update to a purchase and its external payments, without
+    committing."""
+    if invoice.purchase_date != None:
+        db_invoice.sqlmodel_update(
+            {"purchase_date": datetime.combine(invoice.purchase_date, time.min)}
+        )
+
+    if invoice.external_payments != None:
+        payments_ids = [payment.id for payment in external_payments]
+        total_value = 0
+
+        for payment in db_invoice.external_payments:
+            query = select(Invoice).where(
+                (Invoice.id == payment.id) & (Invoice.enabled)
+            )
+            external_payment_invoice = db.scalar(query)
+
+            if external_payment_invoice.id not in payments_ids:
+                total_value -= external_payment_invoice.value
+                db.delete(external_payment_invoice)
+                db.flush()
+
+        db.refresh(db_invoice)
+        if creditors:
+            for creditor, payment in zip(creditors, external_payments):
+                if payment.id != None:  # Edit existing purchase
+                    query = select(Invoice).where(
+                        (Invoice.id == payment.id) & (Invoice.enabled)
+                    )
+                    external_payment_invoice = db.scalar(query)
+
+                    if external_payment_invoice != None:
+                        total_value += payment.value
+                        if total_value > db_invoice.value:
+                            raise HTTPException(
+                                status_code=HTTPStatus.BAD_REQUEST,
+                                detail="Shared payment cannot be greater than the purchase amount",
+                            )
+
+                        data = payment.model_dump(exclude_unset=True)
+                        external_payment_invoice.sqlmodel_update(data)
+                        external_payment_invoice.sqlmodel_update(
+                            {"updated_at": datetime.now()}
+                        )
+                        db.add(external_payment_invoice)
+                        db.flush()
+                else:  # if it doesn't exist, then create one
+                    total_value += payment.value
+
+                    if total_value > db_invoice.value:
+                        raise HTTPException(
+                            status_code=HTTPStatus.BAD_REQUEST,
+                            detail="Shared payment cannot be greater than the purchase amount",
+                        )
+                    create_external_payment(user, db, creditor, payment, db_invoice)
+
+        db.refresh(db_invoice)
+
+    data = invoice.model_dump(exclude_unset=True)
+    db_invoice.sqlmodel_update(data)
+    db_invoice.sqlmodel_update({"updated_at": datetime.now()})
+    db.add(db_invoice)
+    return db_invoice
+
+
+def disable_invoice(user: User, db: Session, invoice: Invoice):
+    for payment in invoice.external_payments:
+        payment.sqlmodel_update({"enabled": False, "updated_at": datetime.now()})
+        db.add(payment)
+
+    invoice.sqlmodel_update({"enabled": False, "updated_at": datetime.now()})
+    db.add(invoice)
+
+
+def mark_invoices_paid(db: Session, ids):
+    updated = db.exec(
+        update(Invoice)
+        .where(Invoice.id.in_(ids) | Invoice.invoice_parent_id.in_(ids))
+        .values(updated_at=datetime.now(), paid_status="PAID")
+        .returning(Invoice.user_id, Invoice.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # Bulk updates skip the flush, so they log their changes themselves.
+    record_changes(db, {(user_id, "invoice", id): False for user_id, id in updated})
+
+
 def add_invoice_installments(installments, is_col: bool = False):
     if is_col or isinstance(installments, InstrumentedAttribute):
         return Invoice.purchase_date + (installments * text("INTERVAL '1 month'"))
@@ -273,3 +457,62 @@ def filter_by_unpaid_invoices(query, current_date):
             else_=(func.date(current_date) - func.date(Invoice.purchase_date) >= 0),
         ),
     )
+
+
+def overdue_invoices_query(current_date):
+    date = case(
+        (
+            func.extract("day", Invoice.purchase_date)
+            > func.extract("day", Creditor.due_date),
+            func.make_date(
+                func.extract("year", Invoice.purchase_date).cast(INTEGER),
+                func.extract("month", Invoice.purchase_date).cast(INTEGER),
+                func.extract("day", Creditor.due_date).cast(INTEGER),
+            )
+            + text("INTERVAL '1 month'"),
+        ),
+        else_=func.make_date(
+            func.extract("year", Invoice.purchase_date).cast(INTEGER),
+            func.extract("month", Invoice.purchase_date).cast(INTEGER),
+            func.extract("day", Creditor.due_date).cast(INTEGER),
+        ),
+    )
+
+    subquery = (
+        select(
+            Invoice.id,
+            Invoice.title,
+            Invoice.purchase_date,
+            case(
+                (
+                    Invoice.payment_type == "INSTALLMENT",
+                    date + (Invoice.installments * text("INTERVAL '1 month'")),
+                ),
+                else_=date + text("INTERVAL '1 month'"),
+            ).label("date"),
+        )
+        .join(Creditor, Creditor.id == Invoice.creditor_id)
+        .where(
+            and_(
+                Invoice.invoice_parent_id == None,
+                Invoice.enabled,
+                Invoice.paid_status != "PAID",
+                or_(
+                    Invoice.payment_type == "INSTALLMENT",
+                    Invoice.payment_type == "CASH",
+                ),
+            )
+        )
+    ).subquery()
+
+    query = select(
+        subquery.c.id.label("id"),
+        subquery.c.purchase_date.label("purchase_date"),
+        subquery.c.title.label("title"),
+        subquery.c.date.label("date"),
+    ).where(
+        func.make_date(current_date.year, current_date.month, current_date.day)
+        > subquery.c.date
+    )
+
+    return query
@@ -1,25 +1,110 @@
+from time import perf_counter
+
+import_started = perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import anyio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routes import creditors, users, token, invoices, analytics, root
+from .config.database import READ_YOUR_WRITES
+from .config.settings import get_env
+from .routes import (
+    creditors,
+    events,
+    users,
+    token,
+    invoices,
+    analytics,
+    metrics,
+    profiles,
+    root,
+    sync,
+)
+from .utils.admission import AdmissionMiddleware, threadpool_size
+from .utils.changes import prune_changes
+from .utils.events import listen
+from .utils.idempotency import (
+    IdempotentReplay,
+    prune_idempotency_keys,
+    replay_response,
+)
+from .utils.metrics import MetricsMiddleware
+from .utils.negotiation import NegotiatedResponse
+from .utils.profiling import ProfilerMiddleware
+from .utils.sql import QueryInstrumentationMiddleware
+from .utils.tasks import run_periodically, task_queue, update_queue_metrics
+from .utils.timing import ServerTimingMiddleware
+from .utils.warmup import warm_up
+
+import_seconds = perf_counter() - import_started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One thread per pooled connection: more would only queue inside the pool.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size()
+    task = asyncio.create_task(warm_up(app, import_seconds))
+    env = get_env()
+    task_queue.start(env.TASK_WORKERS)
+    background = [
+        asyncio.create_task(listen()),
+        asyncio.create_task(
+            run_periodically(prune_changes, env.SYNC_PRUNE_INTERVAL_SECONDS)
+        ),
+        asyncio.create_task(
+            run_periodically(
+                prune_idempotency_keys, env.IDEMPOTENCY_PRUNE_INTERVAL_SECONDS
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(update_queue_metrics, env.TASK_METRICS_INTERVAL_SECONDS)
+        ),
+    ]
+    yield
+    task.cancel()
+    for background_task in background:
+        background_task.cancel()
+    await task_queue.stop()
 
 
 def main():
-    app = FastAPI(title="Invoice Hub", version="1.0")
+    app = FastAPI(
+        title="Invoice Hub",
+        version="1.0",
+        default_response_class=NegotiatedResponse,
+        lifespan=lifespan,
+    )
+    app.add_exception_handler(IdempotentReplay, replay_response)
 
+    # The last one added runs first. Admission sits inside the timing and
+    # metrics layers, and CORS wraps everything, so a 503 from admission is
+    # still timed, counted and readable from the browser.
+    app.add_middleware(QueryInstrumentationMiddleware)
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(ProfilerMiddleware)
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
+        allow_origins=get_env().CORS_ORIGINS,
         allow_methods=["*"],
         allow_headers=["*"],
         allow_credentials=True,
+        expose_headers=[READ_YOUR_WRITES],
     )
 
     app.include_router(invoices.router, prefix="/invoices", tags=["Invoices"])
     app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
     app.include_router(creditors.router, prefix="/creditors", tags=["Creditors"])
+    app.include_router(sync.router, prefix="/sync", tags=["Sync"])
+    app.include_router(events.router, prefix="/events", tags=["Sync"])
     app.include_router(users.router, prefix="/users", tags=["Users"])
     app.include_router(token.router, prefix="/token", tags=["Authentication"])
+    app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+    app.include_router(profiles.router, prefix="/profiles", tags=["Profiling"])
     app.include_router(root.router, tags=["Root"])
 
     return app
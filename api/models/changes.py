@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import Index, text
+from sqlmodel import Field, SQLModel
+
+from api.models.creditors import CreditorPublic
+
+
+class Change(SQLModel, table=True):
+    """Latest change to one invoice or creditor, as seen by its owner.
+
+    Each entity keeps a single row whose version moves forward on every
+    write, so the log is compacted as it is written.
+    """
+
+    __tablename__ = "change"
+    __table_args__ = (
+        Index("ix_change_user_id_version", "user_id", "version", "entity", "entity_id"),
+    )
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    entity: str = Field(primary_key=True)
+    entity_id: int = Field(primary_key=True)
+    version: int
+    deleted: bool = Field(default=False)
+    changed_at: datetime | None = Field(
+        default=None, sa_column_kwargs={"server_default": text("now()")}
+    )
+
+
+class InvoiceSync(SQLModel):
+    id: int
+    creditor_id: int | None
+    invoice_parent_id: int | None
+    purchase_date: datetime
+    title: str
+    value: float
+    installments: int | None
+    payment_type: str
+    paid_status: str
+    updated_at: datetime
+
+
+class SyncDeleted(SQLModel):
+    invoices: List[int] = []
+    creditors: List[int] = []
+
+
+class SyncPage(SQLModel):
+    invoices: List[InvoiceSync] = []
+    creditors: List[CreditorPublic] = []
+    deleted: SyncDeleted = SyncDeleted()
+    next_cursor: str
+    has_more: bool
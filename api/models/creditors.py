@@ -44,6 +44,21 @@ class Creditor(SQLModel, table=True):
     )
 
 
+class CreditorRecord(SQLModel):
+    """The creditor's columns, as answered when it is created."""
+
+    id: int
+    user_id: int
+    creditor_type: CreditorTypeEnum
+    name: str
+    due_date: datetime
+    limit_value: float | None
+    enabled: bool
+    user_as_creditor_id: int | None
+    created_at: datetime
+    updated_at: datetime
+
+
 class CreditorBase(SQLModel):
     creditor_type: CreditorTypeEnum
     name: str
@@ -70,6 +85,10 @@ class CreditorPublic(SQLModel):
     user_as_creditor: UserPublic | None
 
 
+class CreditorEntry(CreditorPublic):
+    user_id: int
+
+
 class CreditorBasic(SQLModel):
     id: int
     creditor_type: CreditorTypeEnum
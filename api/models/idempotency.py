@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Any
+from sqlalchemy import Column, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class IdempotencyKey(SQLModel, table=True):
+    """Response recorded for an Idempotency-Key, committed with the writes it
+    answers."""
+
+    __tablename__ = "idempotency_key"
+
+    scope: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    fingerprint: str
+    status_code: int | None = None
+    response: Any = Field(default=None, sa_column=Column(JSONB, nullable=True))
+    expires_at: datetime = Field(index=True)
+    created_at: datetime | None = Field(
+        default=None, sa_column_kwargs={"server_default": text("now()")}
+    )
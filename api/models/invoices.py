@@ -1,4 +1,5 @@
-from typing import List
+from typing import Annotated, List, Literal, Union
+from pydantic import Field as PydanticField
 from sqlmodel import Field, Relationship, SQLModel
 from datetime import datetime
 import enum
@@ -91,6 +92,50 @@ class InvoicePaidBase(SQLModel):
     ids: List[int] = []
 
 
+class InvoiceCreateOperation(SQLModel):
+    op: Literal["create"]
+    invoice: InvoiceBase
+
+
+class InvoiceUpdateOperation(SQLModel):
+    op: Literal["update"]
+    id: int
+    invoice: InvoiceUpdateBase
+
+
+class InvoiceDeleteOperation(SQLModel):
+    op: Literal["delete"]
+    id: int
+
+
+class InvoiceMarkAsPaidOperation(SQLModel):
+    op: Literal["mark_as_paid"]
+    id: int
+
+
+InvoiceOperation = Annotated[
+    Union[
+        InvoiceCreateOperation,
+        InvoiceUpdateOperation,
+        InvoiceDeleteOperation,
+        InvoiceMarkAsPaidOperation,
+    ],
+    PydanticField(discriminator="op"),
+]
+
+
+class InvoiceBatch(SQLModel):
+    operations: List[InvoiceOperation]
+
+
+class InvoiceOperationResult(SQLModel):
+    index: int
+    op: str
+    status: int
+    id: int | None = None
+    detail: str | None = None
+
+
 class ExternalPayment(SQLModel):
     responsible_creditor: CreditorBasic
     value: float
@@ -10,3 +10,8 @@ class Page(BaseModel, Generic[T]):
     page: int
     size: int
     pages: int
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: str | None
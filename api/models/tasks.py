@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Any
+from sqlalchemy import Column, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class Task(SQLModel, table=True):
+    """Outbox row for work done after the transaction that enqueued it commits."""
+
+    __tablename__ = "task"
+
+    id: int = Field(primary_key=True)
+    kind: str
+    payload: dict[str, Any] = Field(sa_column=Column(JSONB, nullable=False))
+    attempts: int = Field(default=0)
+    last_error: str | None = None
+    # Database clock, so workers on other hosts agree on what is due.
+    available_at: datetime | None = Field(
+        default=None, index=True, sa_column_kwargs={"server_default": text("now()")}
+    )
+    created_at: datetime | None = Field(
+        default=None, sa_column_kwargs={"server_default": text("now()")}
+    )
+    # Set when the task runs out of attempts: it is kept for inspection, and
+    # never picked up again.
+    failed_at: datetime | None = None
@@ -26,6 +26,7 @@ class User(SQLModel, table=True):
     password: str
     spending_limit: float | None = Field(default=None)
     reserve_fund: float | None = Field(default=None)
+    data_version: int = Field(default=0)
 
     invoices: List["Invoice"] = Relationship(back_populates="author")
     creditors: List["Creditor"] = Relationship(
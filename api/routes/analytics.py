@@ -7,6 +7,7 @@ from sqlmodel import Session, and_, case, select, func
 from sqlalchemy.orm import aliased
 
 from api.config.database import get_db
+from api.config.settings import get_env
 from api.functions.invoices import filter_by_unpaid_invoices
 from api.models.creditors import Creditor
 from api.models.invoices import (
@@ -18,23 +19,45 @@ from api.models.invoices import (
 )
 from api.models.users import User
 from api.utils.auth import get_current_user
+from api.utils.cache import Cache, adapter_codec
+from api.utils.etag import check_etag
+from api.utils.routing import AppRoute
 
-router = APIRouter()
+router = APIRouter(route_class=AppRoute)
+env = get_env()
 
 ChildInvoice = aliased(Invoice)
 
 
-@router.get(
-    "/invoices_by_creditor",
-    status_code=HTTPStatus.OK,
-    response_model=List[InvoiceStatsByCreditor],
-)
-def get_invoices_by_creditor(
-    user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
-):
-    current_date = datetime.now()
+class StatsCache(Cache):
+    """Results of one statistics query, keyed by user, data version and day."""
+
+    def __init__(self, name: str, model, build_query):
+        super().__init__(
+            name,
+            adapter_codec(List[model]),
+            env.ANALYTICS_CACHE_SIZE,
+            env.ANALYTICS_CACHE_TTL_SECONDS,
+        )
+        self.model = model
+        self.build_query = build_query
 
+    def fetch(self, db: Session, user: User):
+        now = datetime.now()
+        # Every write bumps the data version, so entries are never invalidated:
+        # they stop being asked for and age out. The day is part of the key, as
+        # it is of the ETag, since the statistics are relative to the date.
+        key = f"{user.id}:{user.data_version}:{now.date().isoformat()}"
+        return self.get(
+            key,
+            lambda: [
+                self.model.model_validate(row)
+                for row in db.exec(self.build_query(user.id, now)).mappings()
+            ],
+        )
+
+
+def invoices_by_creditor_query(user_id: int, current_date: datetime):
     subquery = (
         select(
             Creditor.id,
@@ -83,7 +106,7 @@ def get_invoices_by_creditor(
     )
 
     subquery = subquery.where(
-        and_(Invoice.user_id == user.id, Invoice.enabled, Invoice.paid_status != "PAID")
+        and_(Invoice.user_id == user_id, Invoice.enabled, Invoice.paid_status != "PAID")
     )
 
     subquery = filter_by_unpaid_invoices(subquery, current_date).subquery()
@@ -100,21 +123,28 @@ def get_invoices_by_creditor(
         .group_by(Creditor.id, Creditor.name)
     )
 
-    result = db.exec(query).mappings().all()
-    return result
+    return query
+
+
+invoices_by_creditor_stats = StatsCache(
+    "invoices_by_creditor", InvoiceStatsByCreditor, invoices_by_creditor_query
+)
 
 
 @router.get(
-    "/invoices_by_month",
+    "/invoices_by_creditor",
     status_code=HTTPStatus.OK,
-    response_model=List[InvoiceStatsByMonth],
+    response_model=List[InvoiceStatsByCreditor],
+    dependencies=[Depends(check_etag)],
 )
-def get_invoices_by_month(
+def get_invoices_by_creditor(
     user: Annotated[User, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    current_date = datetime.now()
+    return invoices_by_creditor_stats.fetch(db, user)
 
+
+def invoices_by_month_query(user_id: int, current_date: datetime):
     invoices = (
         select(
             Invoice.id.label("invoice_id"),
@@ -184,7 +214,7 @@ def get_invoices_by_month(
         .where(
             and_(
                 Invoice.invoice_parent_id == None,
-                Invoice.user_id == user.id,
+                Invoice.user_id == user_id,
                 Invoice.enabled,
                 Invoice.paid_status != "PAID",
             )
@@ -210,20 +240,29 @@ def get_invoices_by_month(
         .where(func.extract("year", invoices.c.date) == current_date.year)
     )
 
-    result = db.exec(query).mappings().all()
-    return result
+    return query
+
+
+invoices_by_month_stats = StatsCache(
+    "invoices_by_month", InvoiceStatsByMonth, invoices_by_month_query
+)
 
 
 @router.get(
-    "/invoices_by_week",
+    "/invoices_by_month",
     status_code=HTTPStatus.OK,
-    response_model=List[InvoiceStatsByWeek],
+    response_model=List[InvoiceStatsByMonth],
+    dependencies=[Depends(check_etag)],
 )
-def get_invoices_by_week(
+def get_invoices_by_month(
     user: Annotated[User, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    current_date = datetime.combine(datetime.today(), time.min)
+    return invoices_by_month_stats.fetch(db, user)
+
+
+def invoices_by_week_query(user_id: int, current_date: datetime):
+    current_date = datetime.combine(current_date.date(), time.min)
     start_of_week = current_date - timedelta(days=current_date.weekday() + 1)
     end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
 
@@ -243,7 +282,7 @@ def get_invoices_by_week(
                 Invoice.purchase_date >= start_of_week,
                 Invoice.purchase_date <= end_of_week,
                 Invoice.invoice_parent_id == None,
-                Invoice.user_id == user.id,
+                Invoice.user_id == user_id,
                 Invoice.enabled,
                 Invoice.paid_status != "PAID",
             )
@@ -260,21 +299,30 @@ def get_invoices_by_week(
         .order_by(invoices.c.day_of_week)
     )
 
-    result = db.exec(query).mappings().all()
-    return result
+    return query
+
+
+invoices_by_week_stats = StatsCache(
+    "invoices_by_week", InvoiceStatsByWeek, invoices_by_week_query
+)
 
 
 @router.get(
-    "/invoices_by_payment_type",
+    "/invoices_by_week",
     status_code=HTTPStatus.OK,
-    response_model=List[InvoiceStatsByPaymentType],
+    response_model=List[InvoiceStatsByWeek],
+    dependencies=[Depends(check_etag)],
 )
-def get_invoices_by_payment_type(
+def get_invoices_by_week(
     user: Annotated[User, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    current_date = datetime.now()
+    return invoices_by_week_stats.fetch(db, user)
+
 
+def invoices_by_payment_type_query(user_id: int, current_date: datetime):
+    # The due date filter reads the invoice's own creditor, which must be joined:
+    # left out, every creditor in the table was paired with every invoice.
     subquery = select(
         Invoice.payment_type,
         case(
@@ -284,11 +332,11 @@ def get_invoices_by_payment_type(
             ),
             else_=Invoice.value,
         ).label("amount"),
-    ).group_by(Invoice.id)
+    ).join(Creditor, Creditor.id == Invoice.creditor_id)
 
     subquery = subquery.where(
         and_(
-            Invoice.user_id == user.id,
+            Invoice.user_id == user_id,
             Invoice.enabled,
             Invoice.paid_status != "PAID",
             Invoice.invoice_parent_id == None,
@@ -302,5 +350,24 @@ def get_invoices_by_payment_type(
         func.sum(subquery.c.amount).label("amount"),
     ).group_by(subquery.c.payment_type)
 
-    result = db.exec(query).mappings().all()
-    return result
+    return query
+
+
+invoices_by_payment_type_stats = StatsCache(
+    "invoices_by_payment_type",
+    InvoiceStatsByPaymentType,
+    invoices_by_payment_type_query,
+)
+
+
+@router.get(
+    "/invoices_by_payment_type",
+    status_code=HTTPStatus.OK,
+    response_model=List[InvoiceStatsByPaymentType],
+    dependencies=[Depends(check_etag)],
+)
+def get_invoices_by_payment_type(
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+):
+    return invoices_by_payment_type_stats.fetch(db, user)
@@ -2,6 +2,7 @@ from http import HTTPStatus
 import math
 from typing import Annotated, List
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select, func
 from api.config.database import get_db
 from api.models.creditors import (
@@ -9,20 +10,26 @@ from api.models.creditors import (
     CreditorBase,
     CreditorBasic,
     CreditorPublic,
+    CreditorRecord,
     CreditorUpdateBase,
 )
 
 from api.models.pagination import Page
 from api.models.users import User
 from api.utils.auth import get_current_user
+from api.utils.directory import get_creditor_directory, invalidate_creditors
+from api.utils.etag import check_etag
+from api.utils.idempotency import save_response, user_idempotency
+from api.utils.routing import AppRoute
 
-router = APIRouter()
+router = APIRouter(route_class=AppRoute)
 
 
 @router.post(
     "",
     status_code=HTTPStatus.CREATED,
-    response_model=Creditor,
+    response_model=CreditorRecord,
+    dependencies=[Depends(user_idempotency)],
 )
 def create_creditor(
     user: Annotated[User, Depends(get_current_user)],
@@ -74,6 +81,9 @@ def create_creditor(
     )
 
     db.add(new_creditor)
+    invalidate_creditors(db, user.id)
+    db.flush()
+    save_response(db, HTTPStatus.CREATED, CreditorRecord, new_creditor)
     db.commit()
     db.refresh(new_creditor)
 
@@ -84,6 +94,7 @@ def create_creditor(
     "",
     status_code=HTTPStatus.OK,
     response_model=Page[CreditorPublic],
+    dependencies=[Depends(check_etag)],
 )
 def get_creditors(
     user: Annotated[User, Depends(get_current_user)],
@@ -92,9 +103,24 @@ def get_creditors(
     size: Annotated[int, Query(gt=0)] = 25,
 ):
     offset = page * size
-    query = select(Creditor).where((Creditor.user_id == user.id) & (Creditor.enabled))
-    creditors = db.scalars(query.offset(offset).limit(size))
-    total = db.scalar(query.with_only_columns(func.count(Creditor.id)))
+    condition = (Creditor.user_id == user.id) & (Creditor.enabled)
+    # Counted before LIMIT applies, so the total comes back with the page.
+    rows = db.exec(
+        select(Creditor, func.count().over())
+        .where(condition)
+        .order_by(Creditor.id)
+        .offset(offset)
+        .limit(size)
+        .options(joinedload(Creditor.user_as_creditor))
+    ).all()
+    creditors = [creditor for creditor, _ in rows]
+    if rows:
+        total = rows[0][1]
+    elif offset:
+        # Past the last page there is no row to carry the total.
+        total = db.scalar(select(func.count(Creditor.id)).where(condition))
+    else:
+        total = 0
     pages = math.ceil(total / size)
 
     return {
@@ -110,14 +136,13 @@ def get_creditors(
     "/list",
     status_code=HTTPStatus.OK,
     response_model=List[CreditorBasic],
+    dependencies=[Depends(check_etag)],
 )
 def get_creditors_list(
     user: Annotated[User, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    query = select(Creditor).where((Creditor.user_id == user.id) & (Creditor.enabled))
-    creditors = db.exec(query).all()
-    return creditors
+    return get_creditor_directory(db, user.id).enabled()
 
 
 @router.delete("/{id}", status_code=HTTPStatus.NO_CONTENT)
@@ -142,6 +167,7 @@ def delete_creditor(
 
     creditor.sqlmodel_update({"enabled": False})
     db.add(creditor)
+    invalidate_creditors(db, user.id)
     db.commit()
     db.refresh(creditor)
 
@@ -174,6 +200,7 @@ def update_creditor(
     data = creditor.model_dump(exclude_unset=True)
     db_creditor.sqlmodel_update(data)
     db.add(db_creditor)
+    invalidate_creditors(db, user.id)
     db.commit()
     db.refresh(db_creditor)
     return db_creditor
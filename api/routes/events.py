@@ -0,0 +1,24 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from api.models.users import User
+from api.utils.auth import get_current_user
+from api.utils.events import stream
+from api.utils.routing import AppRoute
+
+router = APIRouter(route_class=AppRoute)
+
+
+@router.get("", response_class=StreamingResponse)
+async def get_events(user: Annotated[User, Depends(get_current_user)]):
+    """Server-Sent Events announcing each committed change to the caller's data.
+
+    A `change` event carries the new data version: fetch `/sync` to get the
+    change itself. `resync` and `evicted` mean events may have been lost.
+    """
+    return StreamingResponse(
+        stream(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
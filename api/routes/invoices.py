@@ -1,19 +1,31 @@
-from datetime import datetime, time
+from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from http import HTTPStatus
 import math
 from typing import Annotated, List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select, func
-from sqlalchemy import not_, and_, or_, case, text, INTEGER
+from sqlalchemy import Integer, not_, update
+from sqlalchemy.orm import selectinload
 
 from api.config.database import get_db
-from api.functions.invoices import create_external_payment, validate_invoice
+from api.config.settings import get_env
+from api.functions.invoices import (
+    add_invoice,
+    check_invoice_access,
+    disable_invoice,
+    edit_invoice,
+    mark_invoices_paid,
+    overdue_invoices_query,
+    validate_invoice,
+)
 from api.models.creditors import Creditor
 from api.models.invoices import (
     Invoice,
     InvoiceBase,
     InvoiceBasic,
+    InvoiceBatch,
+    InvoiceOperationResult,
     InvoicePaidBase,
     InvoicePublic,
     InvoiceUpdateBase,
@@ -21,14 +33,20 @@ from api.models.invoices import (
 from api.models.pagination import Page
 from api.models.users import User
 from api.utils.auth import get_api_key, get_current_user
+from api.utils.changes import array_parameter, record_changes
+from api.utils.etag import check_etag
+from api.utils.idempotency import save_response, user_idempotency
+from api.utils.routing import AppRoute
 
-router = APIRouter()
+router = APIRouter(route_class=AppRoute)
+env = get_env()
 
 
 @router.post(
     "",
     status_code=HTTPStatus.CREATED,
     response_model=InvoiceBase,
+    dependencies=[Depends(user_idempotency)],
 )
 def create_invoice(
     user: Annotated[User, Depends(get_current_user)],
@@ -36,35 +54,131 @@ def create_invoice(
     invoice: InvoiceBase,
 ):
     creditors, external_payments = validate_invoice(user, db, invoice)
+    new_invoice = add_invoice(user, db, invoice, creditors, external_payments)
+    save_response(db, HTTPStatus.CREATED, InvoiceBase, new_invoice)
+    db.commit()
+    return new_invoice
+
+
+def validate_operation(user, db, invoices, disabled, operation):
+    if operation.op == "create":
+        return validate_invoice(user, db, operation.invoice)
 
-    new_invoice = Invoice(
-        user_id=user.id,
-        creditor_id=invoice.creditor_id,
-        purchase_date=datetime.combine(invoice.purchase_date, time.min),
-        title=invoice.title,
-        value=invoice.value,
-        installments=invoice.installments,
-        payment_type=invoice.payment_type,
-        paid_status=invoice.paid_status,
-        creditor_parent_id=invoice.creditor_id,
+    invoice = invoices.get(operation.id)
+    check_invoice_access(
+        user, invoice, "delete" if operation.op == "delete" else "update"
     )
+    if operation.id in disabled:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Item is disabled.")
+    if operation.op == "delete":
+        disabled.add(operation.id)
+    if operation.op == "update":
+        return validate_invoice(user, db, operation.invoice)
+    return [], []
+
+
+def apply_operation(user, db, invoices, operation, creditors, external_payments):
+    if operation.op == "create":
+        invoice = add_invoice(user, db, operation.invoice, creditors, external_payments)
+        return HTTPStatus.CREATED, invoice.id
+    if operation.op == "update":
+        invoice = invoices[operation.id]
+        edit_invoice(user, db, invoice, operation.invoice, creditors, external_payments)
+        return HTTPStatus.OK, invoice.id
+    if operation.op == "delete":
+        disable_invoice(user, db, invoices[operation.id])
+    else:
+        mark_invoices_paid(db, {operation.id})
+    return HTTPStatus.NO_CONTENT, operation.id
 
-    db.add(new_invoice)
-    db.commit()
-    db.refresh(new_invoice)
 
-    if creditors:
-        for creditor, payment in zip(creditors, external_payments):
-            create_external_payment(user, db, creditor, payment, new_invoice)
+@router.post(
+    "/batch",
+    status_code=HTTPStatus.OK,
+    response_model=List[InvoiceOperationResult],
+    response_model_exclude_none=True,
+)
+def batch_invoices(
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+    batch: InvoiceBatch,
+):
+    """Applies creates, updates, deletes and paid marks in order, in a single
+    transaction: either every operation is applied or none is."""
+    operations = batch.operations
+    if len(operations) > env.BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"A batch cannot have more than {env.BATCH_MAX_OPERATIONS} operations",
+        )
 
-    new_invoice.sqlmodel_update({"external_payments": external_payments})
-    return new_invoice
+    # Every invoice the batch refers to, in one query.
+    ids = {operation.id for operation in operations if operation.op != "create"}
+    invoices = {}
+    if ids:
+        query = (
+            select(Invoice)
+            .where(Invoice.id.in_(ids) & Invoice.enabled)
+            .options(selectinload(Invoice.external_payments))
+        )
+        invoices = {invoice.id: invoice for invoice in db.exec(query)}
+
+    # Until the whole batch commits, no operation counts as applied.
+    results = [
+        InvoiceOperationResult(
+            index=index, op=operation.op, status=HTTPStatus.FAILED_DEPENDENCY
+        )
+        for index, operation in enumerate(operations)
+    ]
+
+    def rejected(index, error: HTTPException):
+        results[index].status = error.status_code
+        results[index].detail = error.detail
+        return HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=[result.model_dump(exclude_none=True) for result in results],
+        )
+
+    validated = []
+    rejection = None
+    disabled = set()
+    for index, operation in enumerate(operations):
+        try:
+            validated.append(
+                validate_operation(user, db, invoices, disabled, operation)
+            )
+        except HTTPException as error:
+            # Keeps validating, so the client sees every invalid operation.
+            rejection = rejected(index, error)
+    if rejection is not None:
+        raise rejection
+
+    applied = []
+    for index, (operation, (creditors, external_payments)) in enumerate(
+        zip(operations, validated)
+    ):
+        try:
+            applied.append(
+                apply_operation(
+                    user, db, invoices, operation, creditors, external_payments
+                )
+            )
+        except HTTPException as error:
+            db.rollback()
+            raise rejected(index, error)
+
+    db.commit()
+    for result, (status, id) in zip(results, applied):
+        result.status = status
+        result.id = id
+    return results
 
 
 @router.get(
     "",
     status_code=HTTPStatus.OK,
     response_model=Page[InvoicePublic],
+    dependencies=[Depends(check_etag)],
 )
 def read_invoices(
     user: Annotated[User, Depends(get_current_user)],
@@ -82,7 +196,18 @@ def read_invoices(
     total = db.scalar(query.with_only_columns(func.count(Invoice.id)))
     pages = math.ceil(total / size)
 
-    query = query.group_by(Invoice.id).order_by(Invoice.purchase_date.desc())
+    query = (
+        query.group_by(Invoice.id)
+        .order_by(Invoice.purchase_date.desc())
+        .options(
+            selectinload(Invoice.responsible_creditor).selectinload(
+                Creditor.user_as_creditor
+            ),
+            selectinload(Invoice.external_payments)
+            .selectinload(Invoice.responsible_creditor)
+            .selectinload(Creditor.user_as_creditor),
+        )
+    )
     invoices = db.scalars(query.offset(offset).limit(size))
 
     payments = []
@@ -132,80 +257,27 @@ def mark_all_as_paid(
     _: Annotated[str, Depends(get_api_key)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    now = datetime.now()
-
-    date = case(
-        (
-            func.extract("day", Invoice.purchase_date)
-            > func.extract("day", Creditor.due_date),
-            func.make_date(
-                func.extract("year", Invoice.purchase_date).cast(INTEGER),
-                func.extract("month", Invoice.purchase_date).cast(INTEGER),
-                func.extract("day", Creditor.due_date).cast(INTEGER),
-            )
-            + text("INTERVAL '1 month'"),
-        ),
-        else_=func.make_date(
-            func.extract("year", Invoice.purchase_date).cast(INTEGER),
-            func.extract("month", Invoice.purchase_date).cast(INTEGER),
-            func.extract("day", Creditor.due_date).cast(INTEGER),
-        ),
-    )
+    query = overdue_invoices_query(datetime.now())
+    results = db.exec(query).mappings().all()
+    ids = [purchase.id for purchase in results]
 
-    subquery = (
-        select(
-            Invoice.id,
-            Invoice.title,
-            Invoice.purchase_date,
-            case(
-                (
-                    Invoice.payment_type == "INSTALLMENT",
-                    date + (Invoice.installments * text("INTERVAL '1 month'")),
-                ),
-                else_=date + text("INTERVAL '1 month'"),
-            ).label("date"),
-        )
-        .join(Creditor, Creditor.id == Invoice.creditor_id)
+    # The ids travel as one array parameter, and rows already marked are left
+    # alone so they are not logged as changed again on every run.
+    ids = select(func.unnest(array_parameter("ids", ids, Integer))).scalar_subquery()
+    updated = db.exec(
+        update(Invoice)
         .where(
-            and_(
-                Invoice.invoice_parent_id == None,
-                Invoice.enabled,
-                Invoice.paid_status != "PAID",
-                or_(
-                    Invoice.payment_type == "INSTALLMENT",
-                    Invoice.payment_type == "CASH",
-                ),
-            )
+            Invoice.id.in_(ids) | Invoice.invoice_parent_id.in_(ids),
+            Invoice.paid_status != "OVERDUE",
         )
-    ).subquery()
-
-    query = select(
-        subquery.c.id.label("id"),
-        subquery.c.purchase_date.label("purchase_date"),
-        subquery.c.title.label("title"),
-        subquery.c.date.label("date"),
-    ).where(func.make_date(now.year, now.month, now.day) > subquery.c.date)
-
-    results = db.exec(query).mappings().all()
-
-    for purchase in results:
-        query = select(Invoice).where(Invoice.id == purchase.id)
-        invoice = db.scalar(query)
+        .values(updated_at=datetime.now(), paid_status="OVERDUE")
+        .returning(Invoice.user_id, Invoice.id)
+        .execution_options(synchronize_session=False)
+    ).all()
 
-        for payment in invoice.external_payments:
-            payment.sqlmodel_update(
-                {"updated_at": datetime.now(), "paid_status": "OVERDUE"}
-            )
-            db.add(payment)
-            db.commit()
-            db.refresh(payment)
-
-        invoice.sqlmodel_update(
-            {"updated_at": datetime.now(), "paid_status": "OVERDUE"}
-        )
-        db.add(invoice)
-        db.commit()
-        db.refresh(invoice)
+    # Bulk updates skip the flush, so they log their changes themselves.
+    record_changes(db, {(user_id, "invoice", id): False for user_id, id in updated})
+    db.commit()
     return results
 
 
@@ -215,34 +287,20 @@ def mark_as_paid(
     db: Annotated[Session, Depends(get_db)],
     body: InvoicePaidBase,
 ):
-    ids = body.ids
-    for id in ids:
-        query = select(Invoice).where((Invoice.id == id) & (Invoice.enabled))
-        invoice = db.scalar(query)
-
-        if invoice is not None:
-            if invoice.author.id != user.id:
-                raise HTTPException(
-                    status_code=HTTPStatus.FORBIDDEN,
-                    detail="You do not have permission to update this item.",
-                )
-        else:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND, detail="Item not found"
-            )
+    ids = set(body.ids)
+    query = select(Invoice.id, Invoice.user_id).where(
+        (Invoice.id.in_(ids)) & (Invoice.enabled)
+    )
+    invoices = db.exec(query).all()
 
-        for payment in invoice.external_payments:
-            payment.sqlmodel_update(
-                {"updated_at": datetime.now(), "paid_status": "PAID"}
-            )
-            db.add(payment)
-            db.commit()
-            db.refresh(payment)
+    if len(invoices) != len(ids):
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item not found")
+
+    for invoice in invoices:
+        check_invoice_access(user, invoice, "update")
 
-        invoice.sqlmodel_update({"updated_at": datetime.now(), "paid_status": "PAID"})
-        db.add(invoice)
-        db.commit()
-        db.refresh(invoice)
+    mark_invoices_paid(db, ids)
+    db.commit()
 
 
 @router.patch(
@@ -258,82 +316,10 @@ def update_invoice(
 ):
     query = select(Invoice).where((Invoice.id == id) & (Invoice.enabled))
     db_invoice = db.scalar(query)
-
-    if db_invoice is not None:
-        if db_invoice.author.id != user.id:
-            raise HTTPException(
-                status_code=HTTPStatus.FORBIDDEN,
-                detail="You do not have permission to update this item.",
-            )
-        if not db_invoice.enabled:
-            raise HTTPException(
-                status_code=HTTPStatus.CONFLICT, detail="Item is disabled."
-            )
-    else:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item not found")
+    check_invoice_access(user, db_invoice, "update")
 
     creditors, external_payments = validate_invoice(user, db, invoice)
-
-    if invoice.purchase_date != None:
-        db_invoice.sqlmodel_update(
-            {"purchase_date": datetime.combine(invoice.purchase_date, time.min)}
-        )
-
-    if invoice.external_payments != None:
-        payments_ids = [payment.id for payment in external_payments]
-        total_value = 0
-
-        for payment in db_invoice.external_payments:
-            query = select(Invoice).where(
-                (Invoice.id == payment.id) & (Invoice.enabled)
-            )
-            external_payment_invoice = db.scalar(query)
-
-            if external_payment_invoice.id not in payments_ids:
-                total_value -= external_payment_invoice.value
-                db.delete(external_payment_invoice)
-                db.commit()
-
-        db.refresh(db_invoice)
-        if creditors:
-            for creditor, payment in zip(creditors, external_payments):
-                if payment.id != None:  # Edit existing purchase
-                    query = select(Invoice).where(
-                        (Invoice.id == payment.id) & (Invoice.enabled)
-                    )
-                    external_payment_invoice = db.scalar(query)
-
-                    if external_payment_invoice != None:
-                        total_value += payment.value
-                        if total_value > db_invoice.value:
-                            raise HTTPException(
-                                status_code=HTTPStatus.BAD_REQUEST,
-                                detail="Shared payment cannot be greater than the purchase amount",
-                            )
-
-                        data = payment.model_dump(exclude_unset=True)
-                        external_payment_invoice.sqlmodel_update(data)
-                        external_payment_invoice.sqlmodel_update(
-                            {"updated_at": datetime.now()}
-                        )
-                        db.add(external_payment_invoice)
-                        db.commit()
-                else:  # if it doesn't exist, then create one
-                    total_value += payment.value
-
-                    if total_value > db_invoice.value:
-                        raise HTTPException(
-                            status_code=HTTPStatus.BAD_REQUEST,
-                            detail="Shared payment cannot be greater than the purchase amount",
-                        )
-                    create_external_payment(user, db, creditor, payment, db_invoice)
-
-        db.refresh(db_invoice)
-
-    data = invoice.model_dump(exclude_unset=True)
-    db_invoice.sqlmodel_update(data)
-    db_invoice.sqlmodel_update({"updated_at": datetime.now()})
-    db.add(db_invoice)
+    edit_invoice(user, db, db_invoice, invoice, creditors, external_payments)
     db.commit()
     db.refresh(db_invoice)
 
@@ -348,30 +334,10 @@ def delete_invoice(
 ):
     query = select(Invoice).where((Invoice.id == id) & (Invoice.enabled))
     invoice = db.scalar(query)
+    check_invoice_access(user, invoice, "delete")
 
-    if invoice is not None:
-        if invoice.author.id != user.id:
-            raise HTTPException(
-                status_code=HTTPStatus.FORBIDDEN,
-                detail="You do not have permission to delete this item.",
-            )
-        if not invoice.enabled:
-            raise HTTPException(
-                status_code=HTTPStatus.CONFLICT, detail="Item is already disabled."
-            )
-    else:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item not found")
-
-    for payment in invoice.external_payments:
-        payment.sqlmodel_update({"enabled": False, "updated_at": datetime.now()})
-        db.add(payment)
-        db.commit()
-        db.refresh(payment)
-
-    invoice.sqlmodel_update({"enabled": False, "updated_at": datetime.now()})
-    db.add(invoice)
+    disable_invoice(user, db, invoice)
     db.commit()
-    db.refresh(invoice)
 
 
 # async def update_training_model_by_id(
@@ -0,0 +1,22 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from api.utils.auth import get_api_key
+from api.utils.metrics import render_metrics
+from api.utils.routing import AppRoute
+from api.utils.sql import budget_report
+
+router = APIRouter(route_class=AppRoute)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics(_: Annotated[str, Depends(get_api_key)]):
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get("/budgets")
+async def get_budgets(_: Annotated[str, Depends(get_api_key)]):
+    return budget_report()
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from api.utils.auth import get_api_key
+from api.utils.profiling import list_profiles, read_profile
+from api.utils.routing import AppRoute
+
+router = APIRouter(route_class=AppRoute)
+
+
+@router.get("", status_code=HTTPStatus.OK)
+def get_profiles(_: Annotated[str, Depends(get_api_key)]):
+    return list_profiles()
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+def get_profile(_: Annotated[str, Depends(get_api_key)], profile_id: str):
+    profile = read_profile(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="Profile not found"
+        )
+    return PlainTextResponse(profile)
@@ -1,6 +1,11 @@
+from http import HTTPStatus
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
-router = APIRouter()
+from api.utils.routing import AppRoute
+from api.utils.warmup import report
+
+router = APIRouter(route_class=AppRoute)
 
 
 @router.get("/", tags=["Root"])
@@ -10,3 +15,14 @@ async def get_root():
         "status": "It works! 🔪💀",
     }
     return response
+
+
+@router.get("/ready", tags=["Root"])
+async def get_ready():
+    if not report["ready"]:
+        return JSONResponse(
+            report,
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+    return report
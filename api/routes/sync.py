@@ -0,0 +1,103 @@
+from http import HTTPStatus
+from time import time
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from api.config.database import get_db
+from api.config.settings import get_env
+from api.models.changes import Change, SyncPage
+from api.models.creditors import Creditor
+from api.models.invoices import Invoice
+from api.models.users import User
+from api.utils.auth import get_current_user
+from api.utils.pagination import decode_cursor, encode_cursor
+from api.utils.routing import AppRoute
+
+router = APIRouter(route_class=AppRoute)
+env = get_env()
+
+
+@router.get("", status_code=HTTPStatus.OK, response_model=SyncPage)
+def get_changes(
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+    since: Annotated[str | None, Query()] = None,
+    size: Annotated[int, Query(gt=0, le=500)] = 200,
+):
+    """Invoices and creditors changed after `since`, oldest change first.
+
+    Without `since` it returns every entity. Follow `next_cursor` while
+    `has_more` is set, then keep the last cursor for the next sync.
+    """
+    now_ms = int(time() * 1000)
+    query = select(Change).where(Change.user_id == user.id)
+
+    after = decode_cursor(since, int, str, int, int)
+    if after is None:
+        issued_ms = now_ms
+    else:
+        *position, issued_ms = after
+        # Tombstones older than the retention window are gone, so an older
+        # cursor could miss deletions.
+        if now_ms - issued_ms > env.SYNC_RETENTION_DAYS * 86_400_000:
+            raise HTTPException(
+                status_code=HTTPStatus.GONE,
+                detail="Sync cursor expired, sync again without since",
+            )
+        query = query.where(
+            tuple_(Change.version, Change.entity, Change.entity_id)
+            > tuple_(*position)
+        )
+
+    changes = db.exec(
+        query.order_by(Change.version, Change.entity, Change.entity_id).limit(size + 1)
+    ).all()
+    has_more = len(changes) > size
+    changes = changes[:size]
+
+    upserted = {"invoice": [], "creditor": []}
+    deleted = {"invoice": [], "creditor": []}
+    for change in changes:
+        (deleted if change.deleted else upserted)[change.entity].append(change.entity_id)
+
+    invoices = []
+    if upserted["invoice"]:
+        invoices = db.exec(
+            select(Invoice).where(Invoice.id.in_(upserted["invoice"]))
+        ).all()
+    creditors = []
+    if upserted["creditor"]:
+        creditors = db.exec(
+            select(Creditor)
+            .where(Creditor.id.in_(upserted["creditor"]))
+            .options(selectinload(Creditor.user_as_creditor))
+        ).all()
+
+    # Entities read now may have been disabled after their change was logged:
+    # they are reported as deleted, and their newer change follows later.
+    for entity, rows in (("invoice", invoices), ("creditor", creditors)):
+        found = {row.id for row in rows if row.enabled}
+        deleted[entity].extend(set(upserted[entity]) - found)
+
+    if changes:
+        last = changes[-1]
+        position = (last.version, last.entity, last.entity_id)
+    elif after is None:
+        position = (-1, "", 0)
+    # A finished sync starts the retention window over; a paged one keeps the
+    # time of its first page.
+    next_cursor = encode_cursor(*position, issued_ms if has_more else now_ms)
+
+    return {
+        "invoices": [invoice for invoice in invoices if invoice.enabled],
+        "creditors": [creditor for creditor in creditors if creditor.enabled],
+        "deleted": {
+            "invoices": deleted["invoice"],
+            "creditors": deleted["creditor"],
+        },
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
@@ -5,12 +5,13 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
 
 from api.config.database import get_db
-from api.config.security import verify_password
+from api.config.security import run_hashing, verify_password
 from api.models.users import User
 from api.models.token import Token
 from api.utils.auth import create_access_token
+from api.utils.routing import AppRoute
 
-router = APIRouter()
+router = APIRouter(route_class=AppRoute)
 
 
 @router.post("", status_code=HTTPStatus.OK, response_model=Token)
@@ -19,7 +20,7 @@ def login_for_access_token(
     db: Annotated[Session, Depends(get_db)],
 ):
     user = db.scalar(select(User).where(User.username == form_data.username))
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or not run_hashing(verify_password, form_data.password, user.password):
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST, detail="Incorrect username or password"
         )
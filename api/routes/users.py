@@ -1,23 +1,52 @@
 from http import HTTPStatus
-from typing import Annotated, List
+from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from sqlalchemy import tuple_
+from sqlmodel import Session, func, select
 
 from api.config.database import get_db
-from api.config.security import get_password_hash
+from api.config.security import get_password_hash, run_hashing
+from api.models.pagination import CursorPage
 from api.models.users import UserPublic, User, UserBase
 from api.utils.auth import get_current_user
+from api.utils.idempotency import anonymous_idempotency, save_response
+from api.utils.pagination import decode_cursor, encode_cursor
+from api.utils.routing import AppRoute
 
-router = APIRouter()
+router = APIRouter(route_class=AppRoute)
 
 
-@router.get("", status_code=HTTPStatus.OK, response_model=List[UserPublic])
-async def get_users(
+def username_key():
+    """Sort key served by `ix_user_username_prefix`."""
+    return func.lower(User.username).collate("C")
+
+
+def directory_page(db: Session, user: User, cursor: str | None, size: int, *where):
+    key = username_key()
+    # The cursor takes the key as Postgres computed it: Python's str.lower()
+    # disagrees with lower() on some non-ASCII usernames.
+    query = select(User, key).where(User.id != user.id, *where)
+    after = decode_cursor(cursor, str, int)
+    if after is not None:
+        query = query.where(tuple_(key, User.id) > tuple_(*after))
+    rows = db.exec(query.order_by(key, User.id).limit(size + 1)).all()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last, last_key = rows[-1]
+        next_cursor = encode_cursor(last_key, last.id)
+    return {"items": [row[0] for row in rows], "next_cursor": next_cursor}
+
+
+@router.get("", status_code=HTTPStatus.OK, response_model=CursorPage[UserPublic])
+def get_users(
     user: Annotated[User, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_db)],
+    cursor: Annotated[str | None, Query()] = None,
+    size: Annotated[int, Query(gt=0, le=100)] = 25,
 ):
-    users = db.scalars(select(User).where(User.id != user.id))
-    return users
+    return directory_page(db, user, cursor, size)
 
 
 @router.get("/me", status_code=HTTPStatus.OK, response_model=UserPublic)
@@ -28,27 +57,37 @@ async def get_me(current_user: Annotated[User, Depends(get_current_user)]):
 @router.get(
     "/search",
     status_code=HTTPStatus.OK,
-    response_model=List[UserPublic],
+    response_model=CursorPage[UserPublic],
 )
-async def get_users_by_search(
+def get_users_by_search(
     db: Annotated[Session, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
     search: Annotated[str, Query()],
+    cursor: Annotated[str | None, Query()] = None,
+    size: Annotated[int, Query(gt=0, le=100)] = 25,
 ):
+    search = search.strip().lower()
     if len(search) > 1:
-        query = select(User).where(
-            (User.username.ilike(f"%{search}%")) & (User.id != current_user.id)
+        # Prefix range on the index, in the same byte order as the directory:
+        # "ab0", "ab00", "ab1".
+        upper = search[:-1] + chr(ord(search[-1]) + 1)
+        key = username_key()
+        return directory_page(
+            db, current_user, cursor, size, key >= search, key < upper
         )
-        result = db.exec(query).all()
-        return result
     raise HTTPException(
         status_code=HTTPStatus.BAD_REQUEST,
         detail="Search string must be at least 2 characters long",
     )
 
 
-@router.post("", status_code=HTTPStatus.CREATED, response_model=UserPublic)
-async def create_user(db: Annotated[Session, Depends(get_db)], user: UserBase):
+@router.post(
+    "",
+    status_code=HTTPStatus.CREATED,
+    response_model=UserPublic,
+    dependencies=[Depends(anonymous_idempotency)],
+)
+def create_user(db: Annotated[Session, Depends(get_db)], user: UserBase):
     db_user = db.scalar(
         select(User).where(
             (User.email == user.email) | (User.username == user.username)
@@ -69,9 +108,11 @@ async def create_user(db: Annotated[Session, Depends(get_db)], user: UserBase):
         lastname=user.lastname,
         email=user.email,
         username=user.username,
-        password=get_password_hash(user.password),
+        password=run_hashing(get_password_hash, user.password),
     )
     db.add(new_user)
+    db.flush()
+    save_response(db, HTTPStatus.CREATED, UserPublic, new_user)
     db.commit()
     db.refresh(new_user)
 
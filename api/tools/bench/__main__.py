@@ -0,0 +1,247 @@
+"""HTTP load benchmark replaying a realistic InvoiceHub traffic mix.
+
+python -m api.tools.bench --start-server --duration 30 --output before.json
+python -m api.tools.bench --start-server --duration 30 --compare before.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from time import perf_counter, sleep
+
+from api.tools.bench.client import Client
+from api.tools.bench.scenarios import PASSWORD, SCENARIOS, seed_users
+
+# Request counts depend on --duration, so only rates and latencies are compared.
+COMPARED = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def parse_mix(value: str):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+    return values[index]
+
+
+def start_server(port: int, workers: int):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api.main:main",
+            "--factory",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ]
+    )
+    client = Client(f"http://127.0.0.1:{port}", timeout=2)
+    for _ in range(100):
+        try:
+            client.request("GET", "/")
+            return process
+        except OSError:
+            sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def worker(args, user, mix, seed, stop, warmup_until, samples, errors):
+    rng = random.Random(seed)
+    client = Client(args.base_url)
+    client.login(user.username, PASSWORD)
+    names, weights = list(mix), list(mix.values())
+
+    while not stop.is_set():
+        scenario = SCENARIOS[rng.choices(names, weights)[0]]
+        try:
+            results = scenario(client, user, rng)
+        except OSError:
+            errors[("-", "connection")] += 1
+            continue
+        if perf_counter() < warmup_until:
+            continue
+        for method, route, (status, _, elapsed) in results:
+            samples[(method, route)].append(elapsed)
+            if status >= 400:
+                errors[(method, route)] += 1
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    users = seed_users(args.base_url, args.users, args.prefix)
+
+    stop = threading.Event()
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    warmup_until = perf_counter() + args.warmup
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(
+                args,
+                users[n % len(users)],
+                mix,
+                args.seed + n,
+                stop,
+                warmup_until,
+                samples,
+                errors,
+            ),
+            daemon=True,
+        )
+        for n in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    sleep(args.warmup)
+    started = perf_counter()
+    sleep(args.duration)
+    stop.set()
+    elapsed = perf_counter() - started
+    for thread in threads:
+        thread.join()
+
+    routes = {}
+    for (method, route), values in sorted(samples.items()):
+        values.sort()
+        routes[f"{method} {route}"] = {
+            "requests": len(values),
+            "errors": errors[(method, route)],
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            **{
+                f"p{q}_ms": round(percentile(values, q / 100) * 1000, 3)
+                for q in (50, 95, 99)
+            },
+        }
+
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "throughput_rps": round(total / elapsed, 2),
+        "requests": total,
+        "connection_errors": errors[("-", "connection")],
+        "routes": routes,
+        "budgets": fetch_budgets(args),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fetch_budgets(args):
+    if not args.api_key:
+        return None
+    status, body = Client(args.base_url).json(
+        "GET", "/metrics/budgets", headers={"X-KEY": args.api_key}
+    )
+    return body if status == 200 else None
+
+
+def print_report(report, baseline=None):
+    columns = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{report['label'] or report['commit']}: {report['throughput_rps']} req/s")
+    print(f"{'route':<48}" + "".join(f"{name:>11}" for name in columns))
+    for route, stats in report["routes"].items():
+        print(f"{route:<48}" + "".join(f"{stats[name]:>11}" for name in columns))
+        previous = baseline["routes"].get(route) if baseline else None
+        if previous:
+            print(
+                f"{'  vs ' + (baseline['label'] or baseline['commit'] or ''):<48}"
+                + "".join(
+                    f"{delta(stats[n], previous[n]) if n in COMPARED else '':>11}"
+                    for n in columns
+                )
+            )
+    if baseline:
+        change = delta(report["throughput_rps"], baseline["throughput_rps"])
+        print(f"throughput {change}")
+
+
+def delta(current, previous):
+    if not previous:
+        return "-"
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--prefix", default="bench_user_")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default="dashboard=5,list=3,share=1,paid=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"))
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to compare with")
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        port = int(args.base_url.rsplit(":", 1)[-1].strip("/"))
+        server = start_server(port, args.server_workers)
+    try:
+        report = run(args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
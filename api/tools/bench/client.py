@@ -0,0 +1,60 @@
+import json
+from http.client import HTTPConnection, HTTPException
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+
+
+class Client:
+    """Keep-alive HTTP client, one per benchmark worker thread."""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        parsed = urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.token = None
+        self.connection = None
+
+    def connect(self):
+        self.connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, json_body=None, form=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.token:
+            headers.setdefault("Authorization", f"Bearer {self.token}")
+
+        for attempt in range(2):
+            if self.connection is None:
+                self.connect()
+            start = perf_counter()
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+            except (HTTPException, OSError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+                continue
+            return response.status, payload, perf_counter() - start
+
+    def json(self, method: str, path: str, **kwargs):
+        status, payload, _ = self.request(method, path, **kwargs)
+        return status, json.loads(payload) if payload else None
+
+    def login(self, username: str, password: str):
+        status, body = self.json(
+            "POST", "/token", form={"username": username, "password": password}
+        )
+        if status != 200:
+            return None
+        self.token = body["access_token"]
+        return body["user"]
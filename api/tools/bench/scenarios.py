@@ -0,0 +1,146 @@
+import json
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from api.tools.bench.client import Client
+
+PASSWORD = "bench-password"
+
+ANALYTICS = (
+    "/analytics/invoices_by_creditor",
+    "/analytics/invoices_by_month",
+    "/analytics/invoices_by_week",
+    "/analytics/invoices_by_payment_type",
+)
+
+
+@dataclass
+class BenchUser:
+    id: int
+    username: str
+    bank_id: int
+    shared_creditor_id: int
+    invoice_ids: list = field(default_factory=list)
+
+
+def ensure_user(client: Client, username: str):
+    user = client.login(username, PASSWORD)
+    if user is None:
+        status, body = client.json(
+            "POST",
+            "/users",
+            json_body={
+                "name": "Bench",
+                "lastname": "User",
+                "email": f"{username}@example.com",
+                "username": username,
+                "password": PASSWORD,
+            },
+        )
+        if status != 201:
+            raise RuntimeError(f"Could not create {username}: {status} {body}")
+        user = client.login(username, PASSWORD)
+    return user
+
+
+def ensure_creditor(client: Client, creditors, **creditor):
+    for item in creditors:
+        if item["name"] == creditor["name"]:
+            return item["id"]
+    status, body = client.json("POST", "/creditors", json_body=creditor)
+    if status != 201:
+        raise RuntimeError(f"Could not create creditor: {status} {body}")
+    return body["id"]
+
+
+def seed_users(base_url: str, count: int, prefix: str):
+    """Creates (or reuses) `count` users, each with a bank and a shared creditor."""
+    client = Client(base_url)
+    profiles = [ensure_user(client, f"{prefix}{n}") for n in range(count)]
+
+    users = []
+    for n, profile in enumerate(profiles):
+        partner = profiles[(n + 1) % count]
+        client.login(profile["username"], PASSWORD)
+        _, creditors = client.json("GET", "/creditors/list")
+        bank_id = ensure_creditor(
+            client,
+            creditors,
+            creditor_type="BANK",
+            name="Bench bank",
+            due_date="2025-01-10T00:00:00",
+        )
+        shared_id = bank_id
+        if partner["id"] != profile["id"]:
+            shared_id = ensure_creditor(
+                client,
+                creditors,
+                creditor_type="USER",
+                name=partner["username"],
+                user_as_creditor_id=partner["id"],
+                due_date="2025-01-10T00:00:00",
+            )
+        users.append(BenchUser(profile["id"], profile["username"], bank_id, shared_id))
+    return users
+
+
+def purchase(rng: random.Random, user: BenchUser, shared: bool):
+    value = round(rng.uniform(20, 2000), 2)
+    installments = rng.choice([None, 3, 6, 12])
+    purchased = date.today() - timedelta(days=rng.randrange(90))
+    invoice = {
+        "creditor_id": user.bank_id,
+        "title": "Bench purchase",
+        "value": value,
+        "payment_type": "INSTALLMENT" if installments else "CASH",
+        "installments": installments,
+        "purchase_date": f"{purchased}T00:00:00",
+    }
+    if shared and user.shared_creditor_id != user.bank_id:
+        invoice["external_payments"] = [
+            {"creditor_id": user.shared_creditor_id, "value": round(value / 2, 2)}
+        ]
+    return invoice
+
+
+def dashboard(client: Client, user: BenchUser, rng: random.Random):
+    return [("GET", path, client.request("GET", path)) for path in ANALYTICS]
+
+
+def listing(client: Client, user: BenchUser, rng: random.Random):
+    page = rng.choice([0, 0, 0, 1])
+    path = f"/invoices?page={page}&size=25"
+    return [
+        ("GET", "/invoices", client.request("GET", path)),
+        ("GET", "/creditors/list", client.request("GET", "/creditors/list")),
+    ]
+
+
+def share(client: Client, user: BenchUser, rng: random.Random):
+    result = client.request("POST", "/invoices", json_body=purchase(rng, user, True))
+    return [("POST", "/invoices", result)]
+
+
+def mark_as_paid(client: Client, user: BenchUser, rng: random.Random):
+    if not user.invoice_ids:
+        listed = client.request("GET", "/invoices?page=0&size=50")
+        status, payload, _ = listed
+        if status != 200:
+            # Reported with the other samples: a KeyError would end the worker.
+            return [("GET", "/invoices", listed)]
+        user.invoice_ids = [item["id"] for item in json.loads(payload)["items"]]
+        if not user.invoice_ids:
+            return share(client, user, rng)
+
+    ids = rng.sample(user.invoice_ids, k=min(2, len(user.invoice_ids)))
+    result = client.request("PATCH", "/invoices/mark_as_paid", json_body={"ids": ids})
+    return [("PATCH", "/invoices/mark_as_paid", result)]
+
+
+SCENARIOS = {
+    "dashboard": dashboard,
+    "list": listing,
+    "share": share,
+    "paid": mark_as_paid,
+}
@@ -0,0 +1,73 @@
+"""Measures the per-request overhead of the API's ASGI middleware.
+
+python -m api.tools.middleware_bench --requests 200000
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from api.utils.admission import AdmissionMiddleware
+from api.utils.metrics import MetricsMiddleware
+from api.utils.profiling import ProfilerMiddleware
+from api.utils.sql import QueryInstrumentationMiddleware
+from api.utils.timing import ServerTimingMiddleware
+
+
+class Route:
+    path = "/bench"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+HEADERS = [
+    (b"host", b"localhost"),
+    (b"accept", b"application/json"),
+    (b"authorization", b"Bearer token"),
+]
+
+MIDDLEWARE = {
+    "metrics": MetricsMiddleware,
+    "sql": QueryInstrumentationMiddleware,
+    "profiler": ProfilerMiddleware,
+    "timing": ServerTimingMiddleware,
+    "admission": AdmissionMiddleware,
+}
+
+
+async def run(app, requests: int):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = perf_counter()
+    for _ in range(requests):
+        scope = {"type": "http", "method": "GET", "path": "/bench", "headers": HEADERS}
+        await app(scope, receive, send)
+    return (perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = min(
+        asyncio.run(run(endpoint, args.requests)) for _ in range(args.repeat)
+    )
+    print(f"{'middleware':<16}{'overhead us':>12}")
+    for name, middleware in MIDDLEWARE.items():
+        app = middleware(endpoint)
+        elapsed = min(asyncio.run(run(app, args.requests)) for _ in range(args.repeat))
+        print(f"{name:<16}{(elapsed - baseline) * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
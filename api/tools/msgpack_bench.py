@@ -0,0 +1,117 @@
+"""Compares JSON and msgpack encoding of a `Page[InvoicePublic]`.
+
+python -m api.tools.msgpack_bench --items 500
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from timeit import Timer
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from api.models.invoices import InvoicePublic
+from api.models.pagination import Page
+from api.utils.negotiation import msgpack, render_msgpack
+
+
+def build_page(items: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+
+    def creditor(id: int):
+        return {
+            "id": id,
+            "creditor_type": "USER",
+            "name": f"Creditor {id}",
+            "user_as_creditor": {
+                "id": id,
+                "name": "Maria",
+                "lastname": "Silva",
+                "username": f"maria{id}",
+                "email": f"maria{id}@example.com",
+            },
+        }
+
+    invoices = []
+    for id in range(1, items + 1):
+        installments = rng.choice([None, 3, 6, 12])
+        purchase_date = start + timedelta(days=rng.randrange(730))
+        value = round(rng.uniform(10, 5000), 2)
+        invoices.append(
+            {
+                "id": id,
+                "creditor_id": rng.randrange(1, 20),
+                "purchase_date": purchase_date,
+                "title": f"Purchase {id}",
+                "value": value,
+                "installments": installments,
+                "installment_value": value / installments if installments else None,
+                "installment_paid": rng.randrange(0, 12),
+                "last_payment_date": purchase_date + timedelta(days=30 * 12),
+                "payment_type": "INSTALLMENT" if installments else "CASH",
+                "paid_status": "PENDING",
+                "external_payments": [
+                    {
+                        "id": id * 10 + n,
+                        "value": round(value / 4, 2),
+                        "responsible_creditor": creditor(n + 1),
+                    }
+                    for n in range(rng.choice([0, 0, 1, 2]))
+                ],
+                "responsible_creditor": creditor(rng.randrange(1, 20)),
+            }
+        )
+
+    return {"items": invoices, "total": items, "page": 0, "size": items, "pages": 1}
+
+
+def measure(func, repeat: int):
+    timer = Timer(func)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if msgpack is None:
+        parser.error("msgpack is not installed")
+
+    adapter = TypeAdapter(Page[InvoicePublic])
+    page = adapter.validate_python(build_page(args.items))
+
+    json_response = JSONResponse(content=None)
+
+    def encode_json():
+        return json_response.render(adapter.dump_python(page, mode="json"))
+
+    def encode_msgpack():
+        return render_msgpack(adapter.dump_python(page, mode="python"))
+
+    json_body, msgpack_body = encode_json(), encode_msgpack()
+    results = {
+        "json": (len(json_body), measure(encode_json, args.repeat)),
+        "msgpack": (len(msgpack_body), measure(encode_msgpack, args.repeat)),
+    }
+    decode = {
+        "json": measure(lambda: json.loads(json_body), args.repeat),
+        "msgpack": measure(lambda: msgpack.unpackb(msgpack_body), args.repeat),
+    }
+
+    print(f"Page[InvoicePublic] with {args.items} items")
+    print(f"{'format':<10}{'bytes':>10}{'encode ms':>12}{'decode ms':>12}")
+    for name, (size, encode) in results.items():
+        print(f"{name:<10}{size:>10}{encode * 1000:>12.3f}{decode[name] * 1000:>12.3f}")
+
+    json_size, msgpack_size = results["json"][0], results["msgpack"][0]
+    print(f"msgpack payload is {msgpack_size / json_size:.0%} of the JSON payload")
+
+
+if __name__ == "__main__":
+    main()
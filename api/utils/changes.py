@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    String,
+    bindparam,
+    case,
+    delete,
+    event,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, func
+
+from api.config.database import engine
+from api.config.settings import get_env
+from api.models.changes import Change
+from api.models.creditors import Creditor
+from api.models.invoices import Invoice
+from api.models.users import User
+from api.utils.auth import user_cache
+from api.utils.events import CHANNEL
+
+env = get_env()
+
+ENTITIES = {Invoice: "invoice", Creditor: "creditor"}
+
+
+def array_parameter(name: str, values: list, type_):
+    return bindparam(name, values, type_=ARRAY(type_))
+
+
+def record_changes(db: Session, changes: dict[tuple[int, str, int], bool]):
+    """Writes change log rows, keyed by (user_id, entity, entity_id) and
+    mapping to whether the entity is now deleted.
+
+    Bumps each user's data version and stamps the rows with it. The row lock
+    taken by the bump is held until commit, so versions follow commit order
+    and a client never skips a change that commits after it synced. Each
+    user's event streams are notified on commit, and every worker drops the
+    user from its cache.
+    """
+    if not changes:
+        return
+    connection = db.connection()
+    # pg_notify in RETURNING queues one notification per user without another
+    # round trip; Postgres only delivers it once the transaction commits.
+    rows = connection.execute(
+        update(User)
+        .where(User.id.in_({user_id for user_id, _, _ in changes}))
+        .values(data_version=User.data_version + 1)
+        .returning(
+            User.id,
+            User.data_version,
+            User.username,
+            func.pg_notify(CHANNEL, func.concat(User.id, ":", User.data_version)),
+            user_cache.notification(User.username),
+        )
+    ).all()
+    versions = {user_id: version for user_id, version, _, _, _ in rows}
+    user_cache.invalidate(db, *(row.username for row in rows), notified=True)
+    # One array per column: a bulk write's rows stay four parameters, where a
+    # VALUES list would bind and parse five per row.
+    changed = func.unnest(
+        array_parameter("user_id", [key[0] for key in changes], Integer),
+        array_parameter("entity", [key[1] for key in changes], String),
+        array_parameter("entity_id", [key[2] for key in changes], Integer),
+        array_parameter("deleted", list(changes.values()), Boolean),
+    ).table_valued("user_id", "entity", "entity_id", "deleted").render_derived()
+    version = case(versions, value=changed.c.user_id)
+    statement = insert(Change).from_select(
+        ["user_id", "entity", "entity_id", "version", "deleted"],
+        select(
+            changed.c.user_id,
+            changed.c.entity,
+            changed.c.entity_id,
+            version,
+            changed.c.deleted,
+        ),
+    )
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Change.user_id, Change.entity, Change.entity_id],
+            set_={
+                "version": statement.excluded.version,
+                "deleted": statement.excluded.deleted,
+                "changed_at": func.now(),
+            },
+        )
+    )
+
+
+@event.listens_for(OrmSession, "after_flush")
+def log_flushed_changes(session, flush_context):
+    # Runs inside the flush, so a rolled back savepoint takes its rows with it.
+    changes = {}
+    for instances, deleted in (
+        (session.new, False),
+        (session.dirty, False),
+        (session.deleted, True),
+    ):
+        for instance in instances:
+            entity = ENTITIES.get(type(instance))
+            if entity is not None:
+                key = (instance.user_id, entity, instance.id)
+                changes[key] = deleted or not instance.enabled
+    record_changes(session, changes)
+
+
+def prune_changes():
+    """Drops tombstones older than the retention window."""
+    with Session(engine) as db:
+        db.exec(
+            delete(Change).where(
+                Change.deleted
+                & (
+                    Change.changed_at
+                    < func.now() - timedelta(days=env.SYNC_RETENTION_DAYS)
+                )
+            )
+        )
+        db.commit()
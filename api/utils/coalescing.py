@@ -0,0 +1,91 @@
+import asyncio
+from functools import wraps
+
+from starlette.concurrency import run_in_threadpool
+
+from api.config.database import in_flight_query
+from api.utils.metrics import Counter
+
+# Reads that tabs and devices of the same user tend to fire at the same moment.
+COALESCED_ROUTES = {
+    ("GET", "/invoices"),
+    ("GET", "/analytics/invoices_by_creditor"),
+    ("GET", "/analytics/invoices_by_month"),
+    ("GET", "/analytics/invoices_by_week"),
+    ("GET", "/analytics/invoices_by_payment_type"),
+}
+
+coalesced_requests = Counter(
+    "coalesced_requests_total",
+    "Coalescable reads, by whether they ran the endpoint or shared another run.",
+    ["route", "result"],
+)
+
+
+class Flight:
+    """One run of an endpoint that identical concurrent requests wait on."""
+
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.abandoned = False
+
+
+def hashable(value):
+    if isinstance(value, (list, set)):
+        return tuple(value)
+    return value
+
+
+def coalescing(call, route: str, user: str, parameters: list[str]):
+    """Wraps a read endpoint so identical concurrent requests share one run.
+
+    Requests are identical when they come from the same user at the same data
+    version, for the same route and the same query parameters after defaults
+    are applied. `user` names the endpoint argument that receives the
+    authenticated user. The shared result is serialized by each request on its own,
+    so headers and the response format stay per request.
+    """
+    flights: dict[tuple, Flight] = {}
+    asynchronous = asyncio.iscoroutinefunction(call)
+
+    @wraps(call)
+    async def endpoint(**values):
+        key = (
+            values[user].id,
+            values[user].data_version,
+            *(hashable(values.get(name)) for name in parameters),
+        )
+        while (flight := flights.get(key)) is not None:
+            await flight.done.wait()
+            if flight.error is None:
+                coalesced_requests.inc(route, "coalesced")
+                return flight.result
+            if not flight.abandoned:
+                raise flight.error
+            # The request that ran it went away; the next waiter runs it again.
+
+        flight = flights[key] = Flight()
+        try:
+            if asynchronous:
+                flight.result = await call(**values)
+            else:
+                flight.result = await run_in_threadpool(call, **values)
+            return flight.result
+        except BaseException as error:
+            query = in_flight_query.get()
+            flight.error = error
+            flight.abandoned = isinstance(error, asyncio.CancelledError) or (
+                query is not None and query.cancelled
+            )
+            raise
+        finally:
+            coalesced_requests.inc(route, "executed")
+            del flights[key]
+            flight.done.set()
+
+    return endpoint
+
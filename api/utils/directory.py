@@ -0,0 +1,77 @@
+from typing import List
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from api.config.settings import get_env
+from api.models.creditors import Creditor, CreditorEntry
+from api.utils.cache import Cache, Codec, adapter_codec
+
+env = get_env()
+
+
+class Directory:
+    """Every creditor of one user, enabled or not, as detached public models."""
+
+    def __init__(self, creditors: list[CreditorEntry]):
+        self.creditors = creditors
+        self.by_id = {creditor.id: creditor for creditor in creditors}
+        self.by_user_as_creditor = {
+            creditor.user_as_creditor_id: creditor
+            for creditor in creditors
+            if creditor.user_as_creditor_id is not None
+        }
+
+    def enabled(self):
+        return [creditor for creditor in self.creditors if creditor.enabled]
+
+
+entries = adapter_codec(List[CreditorEntry])
+
+# Keyed by user id. Writes invalidate through `invalidate_creditors`.
+creditor_directory = Cache(
+    "creditors",
+    Codec(
+        lambda directory: entries.dump(directory.creditors),
+        lambda raw: Directory(entries.load(raw)),
+    ),
+    env.CREDITOR_DIRECTORY_USERS,
+    env.CREDITOR_DIRECTORY_TTL_SECONDS,
+)
+
+
+def load_directory(db: Session, user_id: int):
+    query = (
+        select(Creditor)
+        .where(Creditor.user_id == user_id)
+        .order_by(Creditor.id)
+        .options(selectinload(Creditor.user_as_creditor))
+    )
+    return Directory(
+        [CreditorEntry.model_validate(creditor) for creditor in db.exec(query)]
+    )
+
+
+def get_creditor_directory(db: Session, user_id: int):
+    return creditor_directory.get(user_id, lambda: load_directory(db, user_id))
+
+
+def lookup_creditor(db: Session, directory: Directory, creditor_id: int):
+    """Finds a creditor in `directory`, falling back to the database.
+
+    The fallback covers creditors of other users and writes from another
+    worker that this directory has not seen yet.
+    """
+    creditor = directory.by_id.get(creditor_id)
+    if creditor is None:
+        creditor = db.scalar(select(Creditor).where(Creditor.id == creditor_id))
+    return creditor
+
+
+def invalidate_creditors(db: Session, *user_ids: int | None):
+    """Drops the cached directories of these users, on every worker, when `db`
+    commits.
+
+    Call it next to every creditor write, in the same transaction.
+    """
+    creditor_directory.invalidate(db, *user_ids)
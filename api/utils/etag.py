@@ -0,0 +1,46 @@
+from datetime import date
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, Response
+
+from api.models.users import User
+from api.utils.auth import get_current_user
+from api.utils.negotiation import JSON, response_format
+
+
+def make_etag(user: User, media_type: str = JSON):
+    # Listings and analytics are relative to the current date, so the day is part
+    # of the validator as well as the user's data version.
+    etag = f"{user.id}.{user.data_version}.{date.today().toordinal()}"
+    if media_type != JSON:
+        etag += f".{media_type.rpartition('/')[2]}"
+    return f'W/"{etag}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def check_etag(
+    request: Request,
+    response: Response,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    etag = make_etag(user, response_format.get())
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_MODIFIED, headers={**headers, "Vary": "Accept"}
+        )
+
+    response.headers.update(headers)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+
+import anyio
+import psycopg2
+
+from api.config.database import engine
+from api.config.settings import get_env
+from api.utils.cache import CACHE_CHANNEL, clear_local, dispatch
+from api.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+env = get_env()
+
+# Postgres channel carrying "<user_id>:<data_version>" for every committed change.
+CHANNEL = "invoicehub_changes"
+
+events_subscribers = Gauge(
+    "events_subscribers", "Server-Sent Events streams open on this worker."
+)
+events_evicted = Counter(
+    "events_evicted_total", "Event streams closed because the client fell behind."
+)
+
+
+class Subscriber:
+    """One event stream, buffering at most `size` events."""
+
+    __slots__ = ("queue", "evicted")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(size)
+        self.evicted = False
+
+    def push(self, event: dict):
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow consumer loses its buffer and is told to resync instead of
+            # holding memory for events it cannot keep up with.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            self.evicted = True
+            events_evicted.inc()
+
+
+class Hub:
+    """Fans change notifications out to the event streams of this worker."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: dict[int, set[Subscriber]] = {}
+        events_subscribers.set_function(
+            lambda: sum(len(streams) for streams in self.subscribers.values())
+        )
+
+    def subscribe(self, user_id: int):
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id: int, subscriber: Subscriber):
+        streams = self.subscribers.get(user_id)
+        if streams is not None:
+            streams.discard(subscriber)
+            if not streams:
+                del self.subscribers[user_id]
+
+    def publish(self, user_id: int, event: dict):
+        for subscriber in tuple(self.subscribers.get(user_id, ())):
+            subscriber.push(event)
+
+    def publish_all(self, event: dict):
+        for streams in tuple(self.subscribers.values()):
+            for subscriber in tuple(streams):
+                subscriber.push(event)
+
+    def dispatch(self, payload: str):
+        user_id, _, version = payload.partition(":")
+        if user_id.isdigit() and version.isdigit():
+            self.publish(int(user_id), {"event": "change", "version": int(version)})
+
+
+hub = Hub(env.EVENTS_QUEUE_SIZE)
+
+
+def connect_listener():
+    # A connection of its own: LISTEN must outlive any pooled checkout.
+    args, params = engine.dialect.create_connect_args(engine.url)
+    connection = psycopg2.connect(*args, **params)
+    connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+        cursor.execute(f"LISTEN {CACHE_CHANNEL}")
+    return connection
+
+
+async def listen():
+    """Feeds NOTIFY payloads from Postgres into the hub and the caches,
+    reconnecting on failure."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            connection = await anyio.to_thread.run_sync(connect_listener)
+        except Exception:
+            logger.exception("Could not open the change listener")
+            await asyncio.sleep(env.EVENTS_RECONNECT_SECONDS)
+            continue
+
+        fd = connection.fileno()
+        readable = asyncio.Event()
+        loop.add_reader(fd, readable.set)
+        try:
+            # Anything committed while disconnected went unheard.
+            clear_local()
+            hub.publish_all({"event": "resync"})
+            while True:
+                await readable.wait()
+                readable.clear()
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    if notify.channel == CACHE_CHANNEL:
+                        dispatch(notify.payload)
+                    else:
+                        hub.dispatch(notify.payload)
+        except psycopg2.Error:
+            logger.exception("Change listener lost its connection")
+        finally:
+            loop.remove_reader(fd)
+            connection.close()
+        await asyncio.sleep(env.EVENTS_RECONNECT_SECONDS)
+
+
+def format_event(event: dict):
+    data = json.dumps(event, separators=(",", ":"))
+    lines = f"event: {event['event']}\ndata: {data}\n"
+    if "version" in event:
+        lines = f"id: {event['version']}\n" + lines
+    return lines + "\n"
+
+
+async def stream(user_id: int):
+    subscriber = hub.subscribe(user_id)
+    try:
+        yield f"retry: {int(env.EVENTS_RECONNECT_SECONDS * 1000)}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(), env.EVENTS_HEARTBEAT_SECONDS
+                )
+            except TimeoutError:
+                # Keeps proxies from closing an idle stream.
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                yield format_event({"event": "evicted"})
+                return
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(user_id, subscriber)
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from hashlib import sha256
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.routing import serialize_response
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, func, select
+from starlette.concurrency import run_in_threadpool
+
+from api.config.database import engine, get_db
+from api.config.settings import get_env
+from api.models.idempotency import IdempotencyKey
+from api.models.users import User
+from api.utils.auth import get_current_user
+from api.utils.negotiation import NegotiatedResponse, negotiate, response_format
+
+env = get_env()
+
+IDEMPOTENCY_KEY = "Idempotency-Key"
+
+
+class IdempotentReplay(Exception):
+    """Raised to answer a retried request with the response recorded for it."""
+
+    def __init__(self, status_code: int, content):
+        self.status_code = status_code
+        self.content = content
+
+
+async def replay_response(request: Request, replay: IdempotentReplay):
+    # Exception handlers run after the route reset the negotiated format.
+    token = response_format.set(negotiate(request.headers.get("accept")))
+    try:
+        content = replay.content
+        route = request.scope.get("route")
+        if route is not None:
+            # Validated by the route's response field again, so msgpack clients
+            # get native timestamps back rather than the stored ISO strings.
+            content = await serialize_response(
+                field=route.secure_cloned_response_field,
+                response_content=content,
+                include=route.response_model_include,
+                exclude=route.response_model_exclude,
+                by_alias=route.response_model_by_alias,
+                exclude_unset=route.response_model_exclude_unset,
+                exclude_defaults=route.response_model_exclude_defaults,
+                exclude_none=route.response_model_exclude_none,
+            )
+        return NegotiatedResponse(
+            content,
+            status_code=replay.status_code,
+            headers={"Idempotent-Replayed": "true", "Vary": "Accept"},
+        )
+    finally:
+        response_format.reset(token)
+
+
+def claim_key(db: Session, scope: str, key: str, fingerprint: str):
+    table = IdempotencyKey.__table__
+    statement = insert(table).values(
+        scope=scope,
+        key=key,
+        fingerprint=fingerprint,
+        expires_at=func.now() + timedelta(seconds=env.IDEMPOTENCY_TTL_SECONDS),
+    )
+    # A concurrent request with the same key has its row uncommitted: this
+    # insert waits for it, then conflicts and reads what it recorded.
+    claimed = db.exec(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key],
+            set_={
+                "fingerprint": statement.excluded.fingerprint,
+                "status_code": None,
+                "response": None,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=table.c.expires_at < func.now(),
+        ).returning(table.c.key)
+    ).first()
+    if claimed is not None:
+        db.info["idempotency_key"] = (scope, key)
+        # Holds the session back from releasing its transaction early.
+        db.info["flushed"] = True
+        return
+
+    stored = db.exec(
+        select(IdempotencyKey).where(
+            (IdempotencyKey.scope == scope) & (IdempotencyKey.key == key)
+        )
+    ).one()
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    if stored.status_code is None:
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail="The request for this Idempotency-Key has no recorded response",
+        )
+    raise IdempotentReplay(stored.status_code, stored.response)
+
+
+async def check_key(request: Request, db: Session, scope: str):
+    key = request.headers.get(IDEMPOTENCY_KEY)
+    if key is None:
+        return
+    if not 0 < len(key) <= 255:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Idempotency-Key must be between 1 and 255 characters",
+        )
+    digest = sha256(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(await request.body())
+    await run_in_threadpool(claim_key, db, scope, key, digest.hexdigest())
+
+
+async def user_idempotency(
+    request: Request,
+    db: Annotated[Session, Depends(get_db)],
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """Replays the recorded response when the caller retries with the same
+    Idempotency-Key, and serializes concurrent duplicates on that key."""
+    await check_key(request, db, f"user:{user.id}")
+
+
+async def anonymous_idempotency(
+    request: Request, db: Annotated[Session, Depends(get_db)]
+):
+    await check_key(request, db, "anonymous")
+
+
+def save_response(db: Session, status_code: int, model, value):
+    """Records the response of a keyed request; call it before committing.
+
+    `model` is the route's response model. It must not be a table model:
+    validating into one builds a transient row that the session may pick up.
+    """
+    claimed = db.info.pop("idempotency_key", None)
+    if claimed is None:
+        return
+    scope, key = claimed
+    db.exec(
+        update(IdempotencyKey)
+        .where((IdempotencyKey.scope == scope) & (IdempotencyKey.key == key))
+        .values(
+            status_code=status_code,
+            response=model.model_validate(
+                value, from_attributes=True
+            ).model_dump(mode="json"),
+        )
+    )
+
+
+def prune_idempotency_keys():
+    with Session(engine) as db:
+        db.exec(delete(IdempotencyKey).where(IdempotencyKey.expires_at < func.now()))
+        db.commit()
@@ -0,0 +1,239 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+        registry.append(self)
+
+    def format_labels(self, labels, extra=()):
+        pairs = [*zip(self.labelnames, labels), *extra]
+        if not pairs:
+            return ""
+        body = ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs)
+        return "{" + body + "}"
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f"{self.name}{self.format_labels(k)} {v}" for k, v in values]
+
+
+class Gauge(Metric):
+    """Gauge that is either set by the application or read from a callback."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function, *labels):
+        self.functions[labels] = function
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, function in self.functions.items():
+            values[labels] = function()
+        return [f"{self.name}{self.format_labels(k)} {v}" for k, v in values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q: float, match=lambda labels: True):
+        """Estimates a quantile over every series whose labels pass `match`,
+        interpolating inside buckets the way Prometheus' histogram_quantile does.
+        """
+        counts = [0] * (len(self.buckets) + 1)
+        with self.lock:
+            for labels, (series, _, _) in self.values.items():
+                if match(labels):
+                    counts = [a + b for a, b in zip(counts, series)]
+
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for index, bucket in enumerate(counts):
+            if cumulative + bucket >= rank and bucket:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket
+            cumulative += bucket
+        return self.buckets[-1]
+
+    def samples(self):
+        with self.lock:
+            values = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self.values.items()
+            ]
+
+        lines = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket
+                le = self.format_labels(labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{self.format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self.format_labels(labels)} {count}")
+        return lines
+
+
+registry: list[Metric] = []
+
+
+def render_metrics():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being served."
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template and status code.",
+    ["method", "route", "status"],
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements issued while serving a request.",
+    ["method", "route"],
+    buckets=COUNT_BUCKETS,
+)
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool.", ["engine"]
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size.", ["engine"]
+)
+db_pool_size = Gauge(
+    "db_pool_size", "Configured size of the connection pool.", ["engine"]
+)
+db_pool_wait = Histogram(
+    "db_pool_wait_seconds", "Time spent acquiring a pooled connection.", ["engine"]
+)
+password_hashes_in_progress = Gauge(
+    "password_hashes_in_progress", "Password hashes running on request threads."
+)
+
+
+def route_path(scope):
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                elapsed, scope["method"], route_path(scope), str(status)
+            )
@@ -0,0 +1,63 @@
+from contextvars import ContextVar
+from datetime import date, datetime, time, timezone
+
+from fastapi.responses import JSONResponse
+
+from api.utils.timing import phase
+
+try:
+    import msgpack
+except ImportError:  # msgpack is an optional extra
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+response_format: ContextVar[str] = ContextVar("response_format", default=JSON)
+
+
+def negotiate(accept: str | None):
+    if msgpack is None or not accept:
+        return JSON
+
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        if media_type.strip().lower() not in MSGPACK_ALIASES:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q" and value.strip() in ("0", "0.0", "0.00", "0.000"):
+                break
+        else:
+            return MSGPACK
+    return JSON
+
+
+def encode_msgpack_extension(value):
+    # Datetimes go out as the native timestamp extension (6-10 bytes) instead of
+    # a 26 character ISO string. Naive values are the server's wall clock and are
+    # packed as-is, as if they were UTC.
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, date):
+        return msgpack.Timestamp.from_datetime(
+            datetime.combine(value, time.min, tzinfo=timezone.utc)
+        )
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def render_msgpack(content):
+    return msgpack.packb(content, default=encode_msgpack_extension)
+
+
+class NegotiatedResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with phase("serialize"):
+            if response_format.get() == MSGPACK:
+                self.media_type = MSGPACK
+                return render_msgpack(content)
+            return super().render(content)
@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+from http import HTTPStatus
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values):
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str | None, *types):
+    """Returns the keyset values of a cursor, checked against the expected types."""
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(type(value) is kind for value, kind in zip(values, types))
+    ):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Invalid cursor")
+    return values
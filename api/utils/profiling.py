@@ -0,0 +1,227 @@
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import update_wrapper
+from time import perf_counter, time
+from uuid import uuid4
+
+import anyio
+from fastapi.dependencies.utils import (
+    is_async_gen_callable,
+    is_coroutine_callable,
+    is_gen_callable,
+)
+
+from api.config.settings import get_env
+from api.utils.metrics import route_path
+
+env = get_env()
+
+PROFILE_ID = re.compile(r"[0-9]+-[0-9a-f]{8}")
+
+def frame_label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Samples the stacks that belong to one request into collapsed-stack counts.
+
+    Only threadpool threads are sampled, while they run this request's sync
+    endpoint or dependencies, as registered by `ProfiledCall`. The event loop
+    is shared by every request in flight, so its samples would not be this
+    request's.
+    """
+
+    def __init__(self, scope):
+        super().__init__(name="request-profiler", daemon=True)
+        self.scope = scope
+        self.interval = env.PROFILE_INTERVAL_MS / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.threads: set[int] = set()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.samples += 1
+        # A copy, as request threads come and go while the frames are walked.
+        threads = self.threads.copy()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id not in threads:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# Sampler of the request being profiled, copied into the threads that serve it.
+request_sampler: ContextVar[Sampler | None] = ContextVar(
+    "request_sampler", default=None
+)
+
+
+class ProfiledCall:
+    """Sync endpoint or dependency whose thread a profiled request samples.
+
+    Threadpool threads are shared by every request: samples are only theirs
+    while they run this request's code. Compares equal to the wrapped callable,
+    so dependency overrides, keyed by the original, still apply.
+    """
+
+    def __init__(self, call):
+        update_wrapper(self, call)
+        self.call = call
+
+    def __call__(self, *args, **kwargs):
+        sampler = request_sampler.get()
+        if sampler is None:
+            return self.call(*args, **kwargs)
+        thread_id = threading.get_ident()
+        sampler.threads.add(thread_id)
+        try:
+            return self.call(*args, **kwargs)
+        finally:
+            sampler.threads.discard(thread_id)
+
+    def __eq__(self, other):
+        if isinstance(other, ProfiledCall):
+            other = other.call
+        return self.call == other
+
+    def __hash__(self):
+        return hash(self.call)
+
+
+def profile_dependencies(dependant):
+    """Wraps every sync dependency under `dependant` in a `ProfiledCall`."""
+    for dependency in dependant.dependencies:
+        call = dependency.call
+        if not (
+            isinstance(call, ProfiledCall)
+            or is_coroutine_callable(call)
+            or is_gen_callable(call)
+            or is_async_gen_callable(call)
+        ):
+            dependency.call = ProfiledCall(call)
+        profile_dependencies(dependency)
+
+
+def store_profile(profile_id: str, metadata: dict, stacks: Counter):
+    os.makedirs(env.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(env.PROFILE_DIR, profile_id)
+    with open(f"{path}.folded", "w") as file:
+        file.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+    with open(f"{path}.json", "w") as file:
+        json.dump(metadata, file)
+
+    for stale in profile_ids()[env.PROFILE_KEEP :]:
+        for extension in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(env.PROFILE_DIR, stale + extension))
+            except FileNotFoundError:
+                pass
+
+
+def profile_ids():
+    try:
+        names = os.listdir(env.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    ids = {name.rsplit(".", 1)[0] for name in names}
+    return sorted(filter(PROFILE_ID.fullmatch, ids), reverse=True)
+
+
+def list_profiles():
+    profiles = []
+    for profile_id in profile_ids():
+        try:
+            with open(os.path.join(env.PROFILE_DIR, f"{profile_id}.json")) as file:
+                profiles.append(json.load(file))
+        except FileNotFoundError:
+            continue
+    return profiles
+
+
+def read_profile(profile_id: str):
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    try:
+        with open(os.path.join(env.PROFILE_DIR, f"{profile_id}.folded")) as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def profiling_requested(headers):
+    requested = key = None
+    for name, value in headers:
+        if name == b"x-profile":
+            requested = value
+        elif name == b"x-key":
+            key = value
+    return (
+        requested == b"1"
+        and key is not None
+        and hmac.compare_digest(key, env.API_KEY.encode())
+    )
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_requested(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{int(time() * 1000)}-{uuid4().hex[:8]}"
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = Sampler(scope)
+        token = request_sampler.set(sampler)
+        start = perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            request_sampler.reset(token)
+            metadata = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_path(scope),
+                "status": status,
+                "duration_ms": round((perf_counter() - start) * 1000, 3),
+                "samples": sampler.samples,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            await anyio.to_thread.run_sync(
+                store_profile, profile_id, metadata, sampler.stacks
+            )
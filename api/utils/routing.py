@@ -0,0 +1,164 @@
+import asyncio
+from functools import wraps
+from http import HTTPStatus
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from psycopg2 import errorcodes
+from sqlalchemy.exc import OperationalError
+
+from api.config.database import (
+    READ_YOUR_WRITES,
+    InFlightQuery,
+    env,
+    in_flight_query,
+    read_your_writes_token,
+    release_sessions,
+    request_sessions,
+    run_releasing,
+)
+from api.utils.auth import get_current_user
+from api.utils.coalescing import COALESCED_ROUTES, coalescing
+from api.utils.negotiation import MSGPACK, negotiate, response_format
+from api.utils.profiling import ProfiledCall, profile_dependencies
+from api.utils.timing import phase
+
+
+class NegotiatedField:
+    """Response field that keeps Python types when the client asked for msgpack.
+
+    FastAPI always serializes in JSON mode, which would turn datetimes into
+    strings before the msgpack encoder ever sees them.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __getattr__(self, name):
+        return getattr(self.field, name)
+
+    def validate(self, value, *args, **kwargs):
+        with phase("serialize"):
+            return self.field.validate(value, *args, **kwargs)
+
+    def serialize(self, value, *, mode="json", **kwargs):
+        if response_format.get() == MSGPACK:
+            mode = "python"
+        with phase("serialize"):
+            return self.field.serialize(value, mode=mode, **kwargs)
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# nginx's status for a request the client gave up on.
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request, query: InFlightQuery):
+    # Only used on safe methods, which have no body left to read.
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    await run_releasing(query.cancel)
+
+
+def query_canceled(error: OperationalError):
+    return getattr(error.orig, "pgcode", None) == errorcodes.QUERY_CANCELED
+
+
+def releasing_sessions(call):
+    """Wraps an endpoint so its DB sessions are released as soon as it returns."""
+    if asyncio.iscoroutinefunction(call):
+
+        @wraps(call)
+        async def endpoint(**values):
+            try:
+                return await call(**values)
+            finally:
+                if request_sessions.get():
+                    await run_releasing(release_sessions)
+
+    else:
+
+        @wraps(call)
+        def endpoint(**values):
+            try:
+                return call(**values)
+            finally:
+                release_sessions()
+
+    endpoint.releases_sessions = True
+    return endpoint
+
+
+class AppRoute(APIRoute):
+    """Route class shared by every router of the API."""
+
+    def user_parameter(self):
+        """Names the endpoint argument holding the authenticated user."""
+        for dependency in self.dependant.dependencies:
+            if dependency.call is get_current_user:
+                return dependency.name
+        # Keyed by anything else, coalescing could hand one user's data to another.
+        raise RuntimeError(
+            f"{self.path} is coalesced but has no get_current_user dependency"
+        )
+
+    def get_route_handler(self):
+        # A private attribute of APIRoute, which is why fastapi is pinned below
+        # 0.116 in pyproject.toml: check it still exists before raising the pin.
+        field = self.secure_cloned_response_field
+        if field is not None and not isinstance(field, NegotiatedField):
+            self.secure_cloned_response_field = NegotiatedField(field)
+
+        call = self.dependant.call
+        if not getattr(call, "releases_sessions", False):
+            if not asyncio.iscoroutinefunction(call):
+                call = ProfiledCall(call)
+            if any((method, self.path) in COALESCED_ROUTES for method in self.methods):
+                parameters = [
+                    field.name
+                    for field in self.dependant.path_params
+                    + self.dependant.query_params
+                ]
+                call = coalescing(call, self.path, self.user_parameter(), parameters)
+            self.dependant.call = releasing_sessions(call)
+            profile_dependencies(self.dependant)
+
+        handler = super().get_route_handler()
+
+        async def app_route_handler(request: Request):
+            token = response_format.set(negotiate(request.headers.get("accept")))
+            sessions_token = request_sessions.set([])
+            query = watcher = None
+            if request.method in SAFE_METHODS:
+                query = InFlightQuery()
+                watcher = asyncio.create_task(cancel_on_disconnect(request, query))
+            query_token = in_flight_query.set(query)
+            try:
+                with phase("route"):
+                    response = await handler(request)
+            except OperationalError as error:
+                if not query_canceled(error):
+                    raise
+                if query is not None and query.cancelled:
+                    return Response(status_code=CLIENT_CLOSED_REQUEST)
+                raise HTTPException(
+                    status_code=HTTPStatus.GATEWAY_TIMEOUT,
+                    detail="Query exceeded the statement timeout",
+                )
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
+                in_flight_query.reset(query_token)
+                request_sessions.reset(sessions_token)
+                response_format.reset(token)
+            response.headers.append("Vary", "Accept")
+            if (
+                env.DATABASE_REPLICA_URL
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400
+            ):
+                response.headers[READ_YOUR_WRITES] = read_your_writes_token()
+            return response
+
+        return app_route_handler
@@ -0,0 +1,227 @@
+import json
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+
+from api.config.budgets import BUDGETS
+from api.config.settings import get_env
+from api.utils.metrics import (
+    COUNT_BUCKETS,
+    Histogram,
+    db_queries_per_request,
+    http_request_duration,
+    route_path,
+)
+
+logger = logging.getLogger(__name__)
+env = get_env()
+
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent executing SQL while serving a request.",
+    ["method", "route"],
+)
+repeated_statements = Histogram(
+    "db_repeated_statements_per_request",
+    "Executions of the most repeated statement in a request.",
+    ["method", "route"],
+    buckets=COUNT_BUCKETS,
+)
+
+
+class QueryPatternError(RuntimeError):
+    """Raised in strict mode when a request crosses an instrumentation threshold."""
+
+    def __init__(self, report: dict):
+        super().__init__(json.dumps(report, indent=2, default=str))
+        self.report = report
+
+
+class StatementStats:
+    __slots__ = ("count", "duration", "slowest", "slowest_parameters")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = 0.0
+        self.slowest_parameters = None
+
+
+class QueryLog:
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: dict[str, StatementStats] = {}
+
+    def record(self, statement: str, parameters, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+
+        stats = self.statements.get(statement)
+        if stats is None:
+            stats = self.statements[statement] = StatementStats()
+        stats.count += 1
+        stats.duration += elapsed
+        if elapsed >= stats.slowest:
+            stats.slowest = elapsed
+            stats.slowest_parameters = parameters
+
+    def most_repeated(self):
+        if not self.statements:
+            return None, None
+        return max(self.statements.items(), key=lambda item: item[1].count)
+
+
+query_log: ContextVar[QueryLog | None] = ContextVar("query_log", default=None)
+
+# Highest statement count seen per (method, route) by this worker.
+max_queries: dict[tuple[str, str], int] = {}
+
+
+def parameters_shape(parameters):
+    # Only types are logged: bound values can hold personal data.
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [f"{len(parameters)} x", parameters_shape(parameters[0])]
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if query_log.get() is not None:
+        # On the statement's own context: one that fails never reaches
+        # after_cursor_execute, and must not leave anything on the connection.
+        context.query_started = perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = query_log.get()
+    if log is not None:
+        log.record(statement, parameters, perf_counter() - context.query_started)
+
+
+def handle_error(exception_context):
+    # A failed statement (a timeout, a constraint) still took database time.
+    log = query_log.get()
+    started = getattr(exception_context.execution_context, "query_started", None)
+    if log is not None and started is not None:
+        log.record(
+            exception_context.statement,
+            exception_context.parameters,
+            perf_counter() - started,
+        )
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def build_report(scope, log: QueryLog):
+    slow_threshold = env.SQL_SLOW_QUERY_MS / 1000
+    statement, repeated = log.most_repeated()
+    budget = BUDGETS.get((scope["method"], route_path(scope)))
+
+    problems = []
+    if log.count > env.SQL_MAX_QUERIES:
+        problems.append("query_count")
+    if budget is not None and log.count > budget.queries:
+        problems.append("query_budget")
+    if log.duration * 1000 > env.SQL_MAX_DB_TIME_MS:
+        problems.append("db_time")
+    if repeated is not None and repeated.count >= env.SQL_REPEATED_STATEMENTS:
+        problems.append("repeated_statement")
+
+    slowest = sorted(log.statements.items(), key=lambda item: -item[1].slowest)[:3]
+    if slowest and slowest[0][1].slowest > slow_threshold:
+        problems.append("slow_query")
+
+    if not problems:
+        return None
+
+    return {
+        "event": "sql_instrumentation",
+        "problems": problems,
+        "method": scope["method"],
+        "route": route_path(scope),
+        "queries": log.count,
+        "query_budget": budget.queries if budget is not None else None,
+        "db_time_ms": round(log.duration * 1000, 3),
+        "slowest": [
+            {
+                "statement": text,
+                "ms": round(stats.slowest * 1000, 3),
+                "executions": stats.count,
+                "parameters": parameters_shape(stats.slowest_parameters),
+            }
+            for text, stats in slowest
+        ],
+        "repeated": (
+            {"statement": statement, "executions": repeated.count}
+            if "repeated_statement" in problems
+            else None
+        ),
+    }
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = query_log.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_log.reset(token)
+
+        labels = scope["method"], route_path(scope)
+        db_queries_per_request.observe(log.count, *labels)
+        if log.count > max_queries.get(labels, 0):
+            max_queries[labels] = log.count
+        db_time_per_request.observe(log.duration, *labels)
+        if log.statements:
+            repeated_statements.observe(log.most_repeated()[1].count, *labels)
+
+        report = build_report(scope, log)
+        if report is not None:
+            logger.warning(json.dumps(report, default=str))
+            if env.SQL_STRICT:
+                raise QueryPatternError(report)
+
+
+def budget_report():
+    """Compares every budgeted endpoint with what this worker has observed."""
+    report = []
+    for (method, route), budget in BUDGETS.items():
+
+        def match(labels):
+            return labels[:2] == (method, route) and labels[2][0] in "23"
+
+        p95 = http_request_duration.quantile(0.95, match)
+        queries = max_queries.get((method, route))
+        report.append(
+            {
+                "method": method,
+                "route": route,
+                "max_queries": budget.queries,
+                "observed_queries": queries,
+                "p95_ms": budget.p95_ms,
+                "observed_p95_ms": None if p95 is None else round(p95 * 1000, 3),
+                "within_budget": (queries is None or queries <= budget.queries)
+                and (p95 is None or p95 * 1000 <= budget.p95_ms),
+            }
+        )
+    return report
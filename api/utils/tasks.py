@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import timedelta
+from typing import Any, Callable
+
+import anyio
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, func, select
+
+from api.config.database import engine
+from api.config.settings import get_env
+from api.models.tasks import Task
+from api.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+env = get_env()
+
+tasks_processed = Counter(
+    "tasks_processed_total", "Outbox tasks run, by kind and outcome.", ["kind", "result"]
+)
+task_queue_depth = Gauge("task_queue_depth", "Outbox tasks waiting to run.")
+task_queue_lag = Gauge(
+    "task_queue_lag_seconds", "Age of the oldest outbox task still waiting to run."
+)
+task_queue_failed = Gauge(
+    "task_queue_failed", "Outbox tasks that ran out of attempts and were set aside."
+)
+
+handlers: dict[str, Callable[[Session, dict[str, Any]], None]] = {}
+
+
+def task_handler(kind: str):
+    """Registers the function that runs tasks of `kind`.
+
+    Handlers get the worker's session and must not commit: their writes
+    commit together with the removal of the task, which is what makes a
+    retry safe.
+    """
+
+    def decorator(function):
+        handlers[kind] = function
+        return function
+
+    return decorator
+
+
+def enqueue(db: Session, kind: str, payload: dict[str, Any]):
+    """Adds a task to the transaction of `db`; it runs once that commits."""
+    db.add(Task(kind=kind, payload=payload))
+    db.info["tasks_enqueued"] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def wake_workers(session):
+    if session.info.pop("tasks_enqueued", False):
+        task_queue.wake()
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def forget_enqueued(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("tasks_enqueued", None)
+
+
+def retry_delay(attempts: int):
+    return timedelta(seconds=min(2**attempts, env.TASK_RETRY_MAX_SECONDS))
+
+
+def update_queue_metrics():
+    """Refreshes the depth, lag and failure gauges, for housekeeping."""
+    waiting = Task.failed_at == None
+    with Session(engine) as db:
+        depth, lag, failed = db.exec(
+            select(
+                func.count(Task.id).filter(waiting),
+                func.coalesce(
+                    func.extract(
+                        "epoch", func.now() - func.min(Task.created_at).filter(waiting)
+                    ),
+                    0,
+                ),
+                func.count(Task.id).filter(Task.failed_at != None),
+            )
+        ).one()
+    task_queue_depth.set(depth)
+    task_queue_lag.set(float(lag))
+    task_queue_failed.set(failed)
+
+
+def run_next():
+    """Runs the next due task, returning False when there was none."""
+    with Session(engine, expire_on_commit=False) as db:
+        task = db.exec(
+            select(Task)
+            .where((Task.available_at <= func.now()) & (Task.failed_at == None))
+            .order_by(Task.available_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if task is None:
+            return False
+
+        try:
+            # The savepoint keeps the task row locked if the handler fails.
+            with db.begin_nested():
+                handlers[task.kind](db, task.payload)
+        except Exception as error:
+            logger.exception("Task %s (%s) failed", task.id, task.kind)
+            task.attempts += 1
+            task.last_error = repr(error)
+            if task.attempts >= env.TASK_MAX_ATTEMPTS:
+                logger.error(
+                    "Task %s (%s) failed %s times, giving up",
+                    task.id,
+                    task.kind,
+                    task.attempts,
+                )
+                task.failed_at = func.now()
+                result = "failed"
+            else:
+                task.available_at = func.now() + retry_delay(task.attempts)
+                result = "retry"
+            db.add(task)
+            db.commit()
+            tasks_processed.inc(task.kind, result)
+            return True
+
+        db.delete(task)
+        db.commit()
+        tasks_processed.inc(task.kind, "done")
+        return True
+
+
+async def run_periodically(function, seconds: float):
+    """Runs `function` in a thread every `seconds`, for housekeeping."""
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            await anyio.to_thread.run_sync(function)
+        except Exception:
+            logger.exception("Periodic %s failed", function.__name__)
+
+
+class TaskQueue:
+    """Worker coroutines draining the outbox, each running tasks in a thread."""
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.ready: asyncio.Event | None = None
+        self.workers: list[asyncio.Task] = []
+
+    def wake(self):
+        # Called from request threads once their transaction commits.
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def work(self):
+        while True:
+            self.ready.clear()
+            try:
+                ran = await anyio.to_thread.run_sync(run_next)
+            except Exception:
+                logger.exception("Task worker could not reach the outbox")
+                ran = False
+            if not ran:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self.ready.wait(), env.TASK_POLL_SECONDS)
+
+    def start(self, count: int):
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.workers = [asyncio.create_task(self.work()) for _ in range(count)]
+
+    async def stop(self):
+        self.loop = None
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+
+task_queue = TaskQueue()
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from api.config.settings import get_env
+from api.utils.sql import query_log
+
+env = get_env()
+
+
+class RequestTimings:
+    """Elapsed and SQL time per phase, shared by the threads serving a request."""
+
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases: dict[str, list[float]] = {}
+
+    def elapsed(self, name: str):
+        return self.phases.get(name, (0.0, 0.0))[0]
+
+    def db(self, name: str):
+        return self.phases.get(name, (0.0, 0.0))[1]
+
+
+request_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def db_time():
+    log = query_log.get()
+    return log.duration if log is not None else 0.0
+
+
+@contextmanager
+def phase(name: str):
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start, db = perf_counter(), db_time()
+    try:
+        yield
+    finally:
+        entry = timings.phases.setdefault(name, [0.0, 0.0])
+        entry[0] += perf_counter() - start
+        entry[1] += db_time() - db
+
+
+def server_timing(timings: RequestTimings, total: float):
+    metrics = [("db", db_time())]
+    if "route" in timings.phases:
+        # Whatever the route spent outside auth, serialization and SQL.
+        compute = timings.elapsed("route") - timings.db("route")
+        for name in ("auth", "serialize"):
+            compute -= timings.elapsed(name) - timings.db(name)
+        metrics = [
+            ("auth", timings.elapsed("auth")),
+            *metrics,
+            ("compute", max(compute, 0.0)),
+            ("serialize", timings.elapsed("serialize")),
+        ]
+    metrics.append(("total", total))
+    return ", ".join(f"{name};dur={value * 1000:.3f}" for name, value in metrics)
+
+
+def timing_allow_origin(scope):
+    """Timing-Allow-Origin for the request's origin, if CORS allows it.
+
+    Without it, browsers zero the Server-Timing entries they expose to pages
+    on other origins.
+    """
+    if "*" in env.CORS_ORIGINS:
+        return b"*"
+    for name, value in scope["headers"]:
+        if name == b"origin":
+            return value if value.decode("latin-1") in env.CORS_ORIGINS else None
+    return None
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        start = perf_counter()
+        allowed_origin = timing_allow_origin(scope)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing(timings, perf_counter() - start)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", header.encode()))
+                if allowed_origin is not None:
+                    headers.append((b"timing-allow-origin", allowed_origin))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+from contextlib import ExitStack
+from datetime import datetime
+from time import perf_counter
+
+import anyio
+from sqlalchemy.sql import compiler
+from sqlmodel import select
+
+from api.config.database import analytics_engine, engine
+from api.config.security import get_password_hash
+from api.config.settings import get_env
+from api.functions.invoices import overdue_invoices_query
+from api.models.users import User
+from api.routes.analytics import (
+    invoices_by_creditor_query,
+    invoices_by_month_query,
+    invoices_by_payment_type_query,
+    invoices_by_week_query,
+)
+
+# uvicorn configures this logger, so the report shows up next to its startup lines.
+logger = logging.getLogger("uvicorn.error")
+env = get_env()
+
+report = {
+    "ready": False,
+    "import_ms": None,
+    "warmup_ms": None,
+    "steps": {},
+    "failed": {},
+}
+
+
+def hot_statements():
+    now = datetime.now()
+    user = select(User).where(User.username == "")
+    return {
+        engine: [user, overdue_invoices_query(now)],
+        analytics_engine: [
+            user,
+            invoices_by_creditor_query(0, now),
+            invoices_by_month_query(0, now),
+            invoices_by_week_query(0, now),
+            invoices_by_payment_type_query(0, now),
+        ],
+    }
+
+
+def open_connections():
+    with ExitStack() as stack:
+        for pool_engine in (engine, analytics_engine):
+            for _ in range(min(env.WARMUP_CONNECTIONS, pool_engine.pool.size())):
+                connection = stack.enter_context(pool_engine.connect())
+                connection.exec_driver_sql("SELECT 1")
+
+
+def compile_statements():
+    # Same call Connection.execute makes, so requests find these in the cache.
+    for pool_engine, statements in hot_statements().items():
+        linting = pool_engine.dialect.compiler_linting | compiler.WARN_LINTING
+        for statement in statements:
+            statement._compile_w_cache(
+                dialect=pool_engine.dialect,
+                compiled_cache=pool_engine._compiled_cache,
+                column_keys=[],
+                linting=linting,
+            )
+
+
+async def warm_up(app, import_seconds: float):
+    steps = {
+        "connections": lambda: anyio.to_thread.run_sync(open_connections),
+        "statements": lambda: anyio.to_thread.run_sync(compile_statements),
+        # Only builds the document: response validators are built with the routes.
+        "openapi": lambda: anyio.to_thread.run_sync(app.openapi),
+        "password_hash": lambda: anyio.to_thread.run_sync(
+            get_password_hash, "warm-up"
+        ),
+    }
+
+    report["import_ms"] = round(import_seconds * 1000, 3)
+    start = perf_counter()
+    # Failed steps are retried, and /ready keeps answering 503, until each of
+    # them has succeeded: a worker that started with its database down must
+    # not be sent traffic, nor stay out of rotation once the database is back.
+    while steps:
+        for name, step in list(steps.items()):
+            step_start = perf_counter()
+            try:
+                await step()
+            except Exception as error:
+                logger.exception("Warm-up step %s failed", name)
+                report["failed"][name] = repr(error)
+                continue
+            report["failed"].pop(name, None)
+            report["steps"][name] = round((perf_counter() - step_start) * 1000, 3)
+            del steps[name]
+        if steps:
+            await asyncio.sleep(env.WARMUP_RETRY_SECONDS)
+
+    report["warmup_ms"] = round((perf_counter() - start) * 1000, 3)
+    report["ready"] = True
+    logger.info(json.dumps({"event": "startup", **report}))
@@ -0,0 +1,100 @@
+"""Runs the suite against TEST_DATABASE_URL, or a throwaway Postgres.
+
+The settings and engines are read once, when `api` is first imported, so the
+environment is set up in `pytest_configure`, before any test module loads.
+"""
+
+import os
+import tempfile
+from datetime import date
+
+import pytest
+
+SIZES = {
+    "small": {"users": 10, "invoices_per_user": 20},
+    "medium": {"users": 50, "invoices_per_user": 200},
+    "large": {"users": 100, "invoices_per_user": 1000},
+}
+
+server = None
+
+
+def pytest_configure(config):
+    global server
+
+    url = os.environ.get("TEST_DATABASE_URL")
+    if url is None:
+        try:
+            import pgserver
+        except ImportError:
+            raise pytest.UsageError(
+                "Set TEST_DATABASE_URL or install the dev dependencies (pgserver)"
+            )
+        server = pgserver.get_server(tempfile.mkdtemp(prefix="invoicehub-test-"))
+        server.psql("CREATE DATABASE invoicehub;")
+        url = server.get_uri("invoicehub")
+
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("TOKEN_ACCESS_EXPIRE_MINUTES", "60")
+    os.environ.setdefault("TOKEN_SECRET", "test-secret")
+    os.environ.setdefault("TOKEN_ALGORITHM", "HS256")
+    os.environ.setdefault("API_KEY", "test-key")
+
+    from alembic import command
+    from alembic.config import Config
+
+    root = os.path.dirname(os.path.dirname(__file__))
+    command.upgrade(Config(os.path.join(root, "alembic.ini")), "head")
+
+
+def pytest_unconfigure(config):
+    if server is not None:
+        server.cleanup()
+
+
+@pytest.fixture(scope="session")
+def app():
+    from api.main import main
+
+    return main()
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    # Not entered as a context manager: the lifespan would start the task
+    # workers and the listener, whose statements are not the request's.
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session", params=list(SIZES))
+def dataset(request):
+    """Truncates the database and seeds it with one of `SIZES`."""
+    from api.tools.seed import build_parser, load
+    from api.utils.cache import clear_local
+
+    size = SIZES[request.param]
+    args = build_parser().parse_args(
+        [
+            "--truncate",
+            f"--users={size['users']}",
+            f"--invoices-per-user={size['invoices_per_user']}",
+            f"--end={date.today().isoformat()}",
+        ]
+    )
+    load(args)
+    # Seeding skips the ORM, so nothing invalidated what earlier sizes cached.
+    clear_local()
+    return args
+
+
+@pytest.fixture
+def headers(client, dataset):
+    """Authorization for the seeded user in the middle of the dataset."""
+    username = f"{dataset.prefix}{dataset.users // 2}"
+    response = client.post(
+        "/token", data={"username": username, "password": dataset.password}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,36 @@
+def first_invoice(client, headers):
+    page = client.get("/invoices", params={"size": 1}, headers=headers).json()
+    return page["items"][0]["id"]
+
+
+def test_batch_results(client, headers):
+    id = first_invoice(client, headers)
+    response = client.post(
+        "/invoices/batch",
+        json={"operations": [{"op": "mark_as_paid", "id": id}]},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == [
+        {"index": 0, "op": "mark_as_paid", "status": 204, "id": id}
+    ]
+
+
+def test_rejected_batch_applies_nothing(client, headers):
+    id = first_invoice(client, headers)
+    response = client.post(
+        "/invoices/batch",
+        json={
+            "operations": [
+                {"op": "mark_as_paid", "id": id},
+                {"op": "delete", "id": 2**31 - 1},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 400, response.text
+    first, second = response.json()["detail"]
+    # Same shape as a successful batch, and not reported as applied.
+    assert first == {"index": 0, "op": "mark_as_paid", "status": 424}
+    assert second["status"] == 404
+    assert second["detail"]
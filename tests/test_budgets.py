@@ -0,0 +1,63 @@
+"""Holds the endpoints in `BUDGETS` to their statement count.
+
+Statement counts, unlike latency, do not depend on the machine running the
+suite: a lazy relationship added to a listing fails here on any CI runner.
+Every request runs with cold caches, so the counts are those of a miss.
+"""
+
+from typing import Callable, NamedTuple
+
+import pytest
+
+from api.config.budgets import BUDGETS
+from api.config.settings import get_env
+from api.utils.cache import clear_local
+from api.utils.sql import max_queries
+
+REQUESTS = 5
+
+
+class Case(NamedTuple):
+    method: str
+    route: str
+    # Keyword arguments for the request, given the client and the user's headers.
+    arguments: Callable[..., dict] = lambda client, headers: {"headers": headers}
+
+
+def mark_as_paid(client, headers):
+    page = client.get("/invoices", params={"size": 5}, headers=headers).json()
+    ids = [invoice["id"] for invoice in page["items"]]
+    return {"headers": headers, "json": {"ids": ids}}
+
+
+def mark_all_as_paid(client, headers):
+    return {"headers": {"X-KEY": get_env().API_KEY}}
+
+
+CASES = [
+    Case("GET", "/invoices"),
+    Case("GET", "/creditors"),
+    Case("GET", "/creditors/list"),
+    Case("GET", "/analytics/invoices_by_creditor"),
+    Case("GET", "/analytics/invoices_by_month"),
+    Case("GET", "/analytics/invoices_by_week"),
+    Case("GET", "/analytics/invoices_by_payment_type"),
+    Case("PATCH", "/invoices/mark_as_paid", mark_as_paid),
+    Case("PATCH", "/invoices/mark_all_as_paid", mark_all_as_paid),
+]
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.route)
+def test_query_budget(client, headers, dataset, case):
+    arguments = case.arguments(client, headers)
+    labels = case.method, case.route
+    for _ in range(REQUESTS):
+        clear_local()
+        max_queries.pop(labels, None)
+        response = client.request(case.method, case.route, **arguments)
+        assert response.status_code < 300, response.text
+        budget = BUDGETS[labels]
+        assert max_queries.get(labels, 0) <= budget.queries, (
+            f"{case.method} {case.route} ran {max_queries[labels]} statements, "
+            f"budget is {budget.queries}"
+        )
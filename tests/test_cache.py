@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+from sqlalchemy import select
+from sqlmodel import Session
+
+from api.config.database import engine
+from api.utils import cache
+from api.utils.cache import Cache, Codec
+from api.utils.events import listen
+
+test_cache = Cache(
+    "test",
+    Codec(lambda value: json.dumps(value).encode(), json.loads),
+    max_entries=10,
+    ttl=60,
+)
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    monkeypatch.setattr(cache.redis, "Redis", fakeredis.FakeRedis)
+    shared = cache.SharedCache("redis://localhost:6379/0", 0.05)
+    shared.client.flushall()
+    monkeypatch.setattr(cache, "shared_cache", shared)
+    test_cache.local.clear()
+    return shared
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_get_fills_both_tiers(shared):
+    load = Loader({"name": "first"})
+
+    assert test_cache.get("a", load) == {"name": "first"}
+    assert test_cache.get("a", load) == {"name": "first"}
+    assert load.calls == 1
+    assert json.loads(shared.client.get(test_cache.shared_key("a"))) == {
+        "name": "first"
+    }
+
+    # Another worker, with an empty local tier, is answered by the shared one.
+    test_cache.local.clear()
+    assert test_cache.get("a", load) == {"name": "first"}
+    assert load.calls == 1
+
+
+def test_none_is_not_cached(shared):
+    load = Loader(None)
+    assert test_cache.get("a", load) is None
+    assert test_cache.get("a", load) is None
+    assert load.calls == 2
+    assert shared.client.get(test_cache.shared_key("a")) is None
+
+
+def test_invalidate_drops_both_tiers_on_commit(shared):
+    test_cache.get("a", Loader({"name": "first"}))
+
+    with Session(engine) as db:
+        test_cache.invalidate(db, "a")
+        # Nothing is dropped before the write commits.
+        assert test_cache.get("a", Loader({"name": "second"})) == {"name": "first"}
+        db.commit()
+
+    assert shared.client.get(test_cache.shared_key("a")) is None
+    assert test_cache.get("a", Loader({"name": "second"})) == {"name": "second"}
+
+
+def test_rollback_keeps_entries(shared):
+    test_cache.get("a", Loader({"name": "first"}))
+
+    with Session(engine) as db:
+        test_cache.invalidate(db, "a")
+        db.rollback()
+
+    assert test_cache.get("a", Loader({"name": "second"})) == {"name": "first"}
+    assert shared.client.get(test_cache.shared_key("a")) is not None
+
+
+def test_load_racing_an_invalidation_is_not_stored(shared):
+    def stale():
+        # Another node commits a write and invalidates the key while this
+        # load still holds what it read before.
+        test_cache.forget("a")
+        return {"name": "stale"}
+
+    assert test_cache.get("a", stale) == {"name": "stale"}
+
+    assert shared.client.get(test_cache.shared_key("a")) is None
+    assert test_cache.get("a", Loader({"name": "fresh"})) == {"name": "fresh"}
+
+
+def test_load_racing_a_remote_invalidation_is_not_stored_shared(shared):
+    def stale():
+        # Only the shared tier hears about it in time: the writer's NOTIFY
+        # has not reached this worker yet.
+        shared.delete(test_cache.ttl, test_cache.shared_key("a"))
+        return {"name": "stale"}
+
+    test_cache.get("a", stale)
+
+    assert shared.client.get(test_cache.shared_key("a")) is None
+
+
+def test_notify_invalidates_other_workers():
+    async def scenario():
+        test_cache.local.clear()
+        listener = asyncio.create_task(listen())
+        try:
+            # The listener empties every local tier once it is connected.
+            test_cache.get("a", Loader({"name": "first"}))
+            while test_cache.local.get("a") is not cache.MISSING:
+                await asyncio.sleep(0.01)
+
+            test_cache.get("a", Loader({"name": "first"}))
+            # Another worker's committed write, as Postgres sends it.
+            with engine.begin() as connection:
+                connection.execute(select(test_cache.notification("a")))
+
+            while test_cache.local.get("a") is not cache.MISSING:
+                await asyncio.sleep(0.01)
+        finally:
+            listener.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
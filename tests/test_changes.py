@@ -0,0 +1,49 @@
+from sqlmodel import Session, select
+
+from api.config.database import engine
+from api.models.changes import Change
+from api.models.users import User
+
+
+def data_version(username: str):
+    with Session(engine) as db:
+        return db.exec(select(User.data_version).where(User.username == username)).one()
+
+
+def test_write_bumps_data_version_once(client, headers, dataset):
+    username = f"{dataset.prefix}{dataset.users // 2}"
+    before = data_version(username)
+
+    response = client.post(
+        "/creditors",
+        json={"creditor_type": "BANK", "name": "Savings"},
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+
+    assert data_version(username) == before + 1
+    with Session(engine) as db:
+        change = db.exec(
+            select(Change).where(
+                (Change.entity == "creditor")
+                & (Change.entity_id == response.json()["id"])
+            )
+        ).one()
+    assert change.version == before + 1
+
+
+def test_etag_changes_after_write(client, headers):
+    first = client.get("/creditors", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    cached = client.get("/creditors", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    response = client.post(
+        "/creditors", json={"creditor_type": "BANK", "name": "Loan"}, headers=headers
+    )
+    assert response.status_code == 201, response.text
+
+    fresh = client.get("/creditors", headers={**headers, "If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
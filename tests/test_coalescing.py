@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import APIRouter
+
+from api.utils.coalescing import coalescing
+from api.utils.routing import AppRoute
+
+
+def test_requests_are_keyed_by_the_authenticated_user():
+    calls = []
+
+    async def invoices(owner, page):
+        calls.append(owner.id)
+        await asyncio.sleep(0.01)
+        return owner.id
+
+    endpoint = coalescing(invoices, "/invoices", "owner", ["page"])
+    first = SimpleNamespace(id=1, data_version=7)
+    second = SimpleNamespace(id=2, data_version=7)
+
+    async def scenario():
+        return await asyncio.gather(
+            endpoint(owner=first, page=1),
+            endpoint(owner=first, page=1),
+            endpoint(owner=second, page=1),
+        )
+
+    assert asyncio.run(scenario()) == [1, 1, 2]
+    assert sorted(calls) == [1, 2]
+
+
+def test_coalesced_route_requires_the_current_user():
+    router = APIRouter(route_class=AppRoute)
+
+    with pytest.raises(RuntimeError, match="get_current_user"):
+
+        @router.get("/invoices")
+        def invoices(user: str = ""):
+            return []
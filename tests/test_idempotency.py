@@ -0,0 +1,34 @@
+from uuid import uuid4
+
+import pytest
+
+from api.utils.negotiation import MSGPACK
+
+msgpack = pytest.importorskip("msgpack")
+
+
+def create_creditor(client, headers, key, accept):
+    return client.post(
+        "/creditors",
+        json={"creditor_type": "BANK", "name": "Retried"},
+        headers={**headers, "Idempotency-Key": key, "Accept": accept},
+    )
+
+
+def test_replay_is_negotiated_like_the_original(client, headers):
+    key = str(uuid4())
+    original = create_creditor(client, headers, key, MSGPACK)
+    assert original.status_code == 201, original.text
+    assert original.headers["content-type"] == MSGPACK
+
+    replayed = create_creditor(client, headers, key, MSGPACK)
+    assert replayed.status_code == 201
+    assert replayed.headers["idempotent-replayed"] == "true"
+    assert replayed.headers["content-type"] == MSGPACK
+    assert msgpack.unpackb(replayed.content, timestamp=3) == msgpack.unpackb(
+        original.content, timestamp=3
+    )
+
+    as_json = create_creditor(client, headers, key, "application/json")
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_json.json()["id"] == msgpack.unpackb(original.content)["id"]
@@ -0,0 +1,47 @@
+from api.config.database import READ_YOUR_WRITES, read_your_writes_token
+from api.utils import timing
+from api.utils.admission import Rejected, controllers, route_class
+
+
+def test_admission_rejection_is_timed_and_cors_readable(client, monkeypatch):
+    async def full(route_class):
+        raise Rejected("queue_full")
+
+    monkeypatch.setattr(controllers["analytics"], "acquire", full)
+    response = client.get("/invoices", headers={"Origin": "https://app.example.com"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+    assert response.headers["access-control-allow-origin"]
+    assert "total;dur=" in response.headers["server-timing"]
+
+
+def test_admission_rejection_allows_timing(client, monkeypatch):
+    async def full(route_class):
+        raise Rejected("timeout")
+
+    monkeypatch.setattr(controllers["oltp"], "acquire", full)
+    response = client.get("/users/me", headers={"Origin": "https://app.example.com"})
+
+    assert response.status_code == 503
+    assert response.headers["timing-allow-origin"] == "*"
+
+
+def test_timing_allow_origin_follows_cors_origins(monkeypatch):
+    monkeypatch.setattr(timing.env, "CORS_ORIGINS", ["https://app.example.com"])
+    allowed = {"headers": [(b"origin", b"https://app.example.com")]}
+    other = {"headers": [(b"origin", b"https://evil.example.com")]}
+
+    assert timing.timing_allow_origin(allowed) == b"https://app.example.com"
+    assert timing.timing_allow_origin(other) is None
+    assert timing.timing_allow_origin({"headers": []}) is None
+
+
+def test_pinned_reads_are_admitted_to_the_primary_pool():
+    def scope(*headers):
+        return {"method": "GET", "path": "/invoices", "headers": list(headers)}
+
+    pin = (READ_YOUR_WRITES.lower().encode(), read_your_writes_token().encode())
+    assert route_class(scope()) == "analytics"
+    assert route_class(scope(pin)) == "read"
+    assert route_class(scope((pin[0], b"forged.token"))) == "analytics"
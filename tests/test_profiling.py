@@ -0,0 +1,79 @@
+import threading
+import time
+
+from api.config.database import get_db
+from api.config.settings import get_env
+from api.utils.auth import get_current_user
+from api.utils.profiling import (
+    ProfiledCall,
+    Sampler,
+    read_profile,
+    request_sampler,
+)
+
+
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_attributes_samples_by_thread():
+    stop = threading.Event()
+    # Two threads in the same code: only the registered one is this request's.
+    threads = [threading.Thread(target=spin, args=(stop,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        sampler = Sampler({})
+        sampler.threads.add(threads[0].ident)
+        for _ in range(10):
+            sampler.sample()
+            time.sleep(0.001)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert sum(sampler.stacks.values()) == 10
+    assert all("spin" in stack for stack in sampler.stacks)
+
+
+def test_profiled_call_registers_its_thread():
+    sampler = Sampler({})
+    seen = []
+
+    @ProfiledCall
+    def endpoint():
+        seen.append(threading.get_ident() in sampler.threads)
+
+    endpoint()
+    token = request_sampler.set(sampler)
+    try:
+        endpoint()
+    finally:
+        request_sampler.reset(token)
+
+    assert seen == [False, True]
+    assert not sampler.threads
+
+
+def test_sync_dependencies_are_profiled(app):
+    route = next(route for route in app.routes if route.path == "/creditors/list")
+    dependencies = {
+        dependency.name: dependency for dependency in route.dependant.dependencies
+    }
+
+    # Still equal to the functions they wrap, for dependency_overrides.
+    assert isinstance(dependencies["user"].call, ProfiledCall)
+    assert dependencies["user"].call == get_current_user
+    # get_db is an async generator: it runs on the event loop, not a thread.
+    assert dependencies["db"].call is get_db
+
+
+def test_profiled_request_is_stored(client, headers):
+    response = client.get(
+        "/creditors",
+        headers={**headers, "X-Profile": "1", "X-KEY": get_env().API_KEY},
+    )
+    assert response.status_code == 200
+    assert read_profile(response.headers["x-profile-id"]) is not None
@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from api.config.database import engine
+from api.utils.sql import QueryLog, query_log
+
+
+def test_failed_statement_is_recorded_and_leaves_nothing_behind():
+    log = QueryLog()
+    token = query_log.set(log)
+    try:
+        with engine.connect() as connection:
+            with pytest.raises(DBAPIError):
+                connection.execute(text("SELECT 1 / 0"))
+            connection.rollback()
+            connection.execute(text("SELECT pg_sleep(0.05)"))
+            leftovers = [key for key in connection.info if "started" in key]
+    finally:
+        query_log.reset(token)
+
+    assert log.count == 2
+    assert log.statements["SELECT 1 / 0"].count == 1
+    assert log.statements["SELECT pg_sleep(0.05)"].slowest >= 0.05
+    assert leftovers == []
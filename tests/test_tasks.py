@@ -0,0 +1,44 @@
+from sqlmodel import Session, delete, func, select, update
+
+from api.config.database import engine
+from api.config.settings import get_env
+from api.models.tasks import Task
+from api.utils import tasks
+from api.utils.tasks import enqueue, run_next, task_handler, update_queue_metrics
+
+
+@task_handler("test_broken")
+def broken(db, payload):
+    raise ValueError(payload["reason"])
+
+
+def make_due():
+    with Session(engine) as db:
+        db.exec(update(Task).values(available_at=func.now()))
+        db.commit()
+
+
+def test_task_fails_after_max_attempts():
+    with Session(engine) as db:
+        db.exec(delete(Task))
+        enqueue(db, "test_broken", {"reason": "always"})
+        db.commit()
+
+    for _ in range(get_env().TASK_MAX_ATTEMPTS):
+        make_due()
+        assert run_next()
+
+    with Session(engine) as db:
+        task = db.exec(select(Task).where(Task.kind == "test_broken")).one()
+    assert task.attempts == get_env().TASK_MAX_ATTEMPTS
+    assert task.failed_at is not None
+    assert "always" in task.last_error
+
+    # Set aside, even once due again.
+    make_due()
+    assert not run_next()
+
+    update_queue_metrics()
+    assert tasks.task_queue_depth.values[()] == 0
+    assert tasks.task_queue_failed.values[()] == 1
+
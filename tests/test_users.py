@@ -0,0 +1,34 @@
+from uuid import uuid4
+
+
+def test_search_pages_through_non_ascii_usernames(client, headers):
+    prefix = f"zq{uuid4().hex[:8]}"
+    # Postgres lowers "İ" to "i"; Python's str.lower() to "i" and a combining dot.
+    usernames = [f"{prefix}İ1", f"{prefix}i2", f"{prefix}i3"]
+    for n, username in enumerate(usernames):
+        response = client.post(
+            "/users",
+            json={
+                "name": "Search",
+                "lastname": "User",
+                "email": f"{prefix}{n}@example.com",
+                "username": username,
+                "password": "search-password",
+            },
+        )
+        assert response.status_code == 201, response.text
+
+    found, cursor = [], None
+    while True:
+        params = {"search": prefix, "size": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/users/search", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        found += [user["username"] for user in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert found == usernames
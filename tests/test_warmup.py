@@ -0,0 +1,41 @@
+import asyncio
+
+from api.utils import warmup
+
+
+def test_ready_waits_for_failed_steps(client, monkeypatch):
+    monkeypatch.setattr(warmup.env, "WARMUP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(
+        warmup,
+        "report",
+        {**warmup.report, "ready": False, "steps": {}, "failed": {}},
+    )
+    monkeypatch.setattr("api.routes.root.report", warmup.report)
+    attempts = []
+
+    def database_down_once():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise ConnectionError("database is down")
+
+    monkeypatch.setattr(warmup, "open_connections", database_down_once)
+
+    async def scenario():
+        task = asyncio.create_task(warmup.warm_up(client.app, 0.1))
+        while not warmup.report["failed"]:
+            await asyncio.sleep(0)
+        assert not warmup.report["ready"]
+        assert client.get("/ready").status_code == 503
+        await asyncio.wait_for(task, 30)
+
+    asyncio.run(scenario())
+
+    assert len(attempts) == 2
+    assert warmup.report["failed"] == {}
+    assert set(warmup.report["steps"]) == {
+        "connections",
+        "statements",
+        "openapi",
+        "password_hash",
+    }
+    assert client.get("/ready").status_code == 200